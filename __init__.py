@@ -24,10 +24,8 @@
 #   Features:
 #       + On try switchup lamp, search the lamp in the network
 #       + Load and cache profiles
-#       + Address cache on discover devices and connections
 #       + Mutexes asyncio lock based
 #       + (Rooms working), Timers, Routines, Device Groups
-#       + Remove entities when they are gone from the klyqa account
 #
 #   QA:
 #       + Convert magicvalues to constants (commands, arguments, values)
@@ -55,10 +53,37 @@ from homeassistant.const import (
     CONF_SCAN_INTERVAL,
 )
 
-PLATFORMS: list[Platform] = [Platform.LIGHT]
+PLATFORMS: list[Platform] = [Platform.LIGHT, Platform.SENSOR]
 SCAN_INTERVAL = timedelta(seconds=30)
 
 
+def blocking_classes() -> tuple[type, ...]:
+    """Return the classes watched for event loop blocking in asyncio debug mode.
+
+    Imported here, so the platforms aren't imported with the integration
+    unless the detection is on.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .command import KlyqaCommandQueue
+    from .datacoordinator import KlyqaDatagramProtocol
+    from .light import KlyqaLight, KlyqaLightGroup
+    from .poller import KlyqaFleetPoller
+    from .pool import KlyqaConnectionPool
+    from .rooms import KlyqaRoomSync
+
+    return (
+        KlyqaDataCoordinator,
+        KlyqaDatagramProtocol,
+        HAKlyqaAccount,
+        KlyqaConnectionPool,
+        KlyqaFleetPoller,
+        KlyqaRoomSync,
+        KlyqaLight,
+        KlyqaLightGroup,
+        KlyqaCommandQueue,
+    )
+
+
 async def async_setup(hass: HomeAssistant, yaml_config: ConfigType) -> bool:
     """Set up the klyqa component."""
     if DOMAIN in hass.data:
@@ -67,7 +92,12 @@ async def async_setup(hass: HomeAssistant, yaml_config: ConfigType) -> bool:
     component = hass.data[DOMAIN] = KlyqaDataCoordinator.instance(
         LOGGER, DOMAIN, hass, SCAN_INTERVAL
     )
+    if hass.loop.get_debug():
+        component.blocking.enable(blocking_classes())
     await component.async_setup(yaml_config)
+    await component.addresses.async_load()
+    await component.async_get_ports()
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, component.async_close_ports)
     if (
         Platform.LIGHT in yaml_config
         and DOMAIN in yaml_config[Platform.LIGHT]
@@ -85,8 +115,6 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     host = str(entry.data.get(CONF_HOST))
     scan_interval = int(entry.data.get(CONF_SCAN_INTERVAL))
     polling = bool(entry.data.get(CONF_POLLING))
-    global SCAN_INTERVAL
-    SCAN_INTERVAL = timedelta(seconds=scan_interval)
     sync_rooms = (
         entry.data.get(CONF_SYNC_ROOMS) if entry.data.get(CONF_SYNC_ROOMS) else False
     )
@@ -105,8 +133,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         klyqa_api.password = password
         klyqa_api.host = host
         klyqa_api.sync_rooms = sync_rooms
-        klyqa_api.polling = (polling,)
+        klyqa_api.set_polling(polling)
         klyqa_api.scan_interval = scan_interval
+        klyqa_api.set_scan_interval(scan_interval)
     else:
         klyqa_api: HAKlyqaAccount = HAKlyqaAccount(
             component.udp,
@@ -123,12 +152,14 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             component.entries = {}
         component.entries[entry.entry_id] = klyqa_api
 
+    klyqa_api.entry_id = entry.entry_id
+
     if not await klyqa_api.login():
         return False
 
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
-
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, klyqa_api.shutdown)
+    # bulbs would keep pushing to the connections of the unloaded account
+    entry.async_on_unload(klyqa_api.async_stop)
 
     # For previous config entries where unique_id is None
     if entry.unique_id is None:
@@ -153,10 +184,8 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # if not unload_ok:
     #     return unload_ok
 
-    while hass.data[DOMAIN].remove_listeners:
-        listener = hass.data[DOMAIN].remove_listeners.pop(-1)
-        if callable(listener):
-            listener()
+    # the listeners of the entry are removed with entry.async_on_unload, the
+    # domain wide remove_listeners belong to the configuration.yaml accounts
 
     if DOMAIN in hass.data:
         if entry.entry_id in hass.data[DOMAIN].entries:
@@ -0,0 +1,56 @@
+"""Klyqa bulb address cache."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, LOGGER
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.bulb_addresses"
+SAVE_DELAY = 30
+
+
+class KlyqaAddressCache:
+    """Last known network address by bulb unit id.
+
+    Refreshed from every bulb connection that got an answer and persisted in
+    the Home Assistant storage, so bulbs can be reached directly after a
+    restart.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the address cache."""
+        self.hass = hass
+        self._store: Store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._addresses: dict[str, dict[str, Any]] = {}
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        """Load the persisted addresses."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            data = await self._store.async_load()
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.error("Could not load cached bulb addresses")
+            return
+        for u_id, address in (data or {}).items():
+            self._addresses.setdefault(u_id, address)
+
+    def get(self, u_id: str) -> str | None:
+        """Return the last known ip address of the bulb."""
+        address = self._addresses.get(u_id)
+        return address["ip"] if address else None
+
+    def update(self, u_id: str, ip: str, port: int) -> None:
+        """Remember the address the bulb connected from."""
+        address = self._addresses.get(u_id)
+        if address and address["ip"] == ip:
+            return
+        self._addresses[u_id] = {"ip": ip, "port": port, "seen": time.time()}
+        self._store.async_delay_save(lambda: self._addresses, SAVE_DELAY)
@@ -0,0 +1,187 @@
+"""Benchmark accepting many bulb connections at once.
+
+Sets up the integration against a simulated fleet like bench_fleet.py,
+then closes all pooled connections and updates all lights at once, so
+every bulb of the fleet connects to the tcp port at the same time. The
+burst is repeated with the listen backlog of the data coordinator set to
+each of the given values:
+
+    update    KlyqaLight.async_update of all lights until the answer
+    connect   connection accepted until it was handed to the account
+    discovery message queued until the bulb connection was accepted
+
+Bulbs that did not answer during a burst are counted as failed. Every
+fleet size and backlog runs in its own process.
+
+Usage: python benchmarks/bench_accept.py [--bulbs 32 64 128 256]
+           [--backlogs 1 128] [--rounds 3]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any
+
+from bench_fleet import (
+    DOMAIN,
+    async_start_hass,
+    async_wait_for_lights,
+    benchmark_entry,
+    percentile,
+    prepare_child,
+)
+
+SETTLE_TIME = 1.0
+"""seconds to wait for the bulbs to notice their closed connections"""
+
+
+async def async_bench(
+    bulbs: int, backlog: int, rounds: int, workdir: str
+) -> list[dict[str, Any]]:
+    """Connect all bulbs of the fleet at once in each round."""
+    # pylint: disable=import-outside-toplevel
+    from custom_components.klyqa import datacoordinator
+    from simulator import SimulatedFleet, StubCloud
+
+    datacoordinator.TCP_BACKLOG = backlog
+
+    fleet = SimulatedFleet(bulbs)
+    fleet.start_in_thread()
+    cloud = StubCloud(fleet, fleet.account_settings(rooms=10, groups=1))
+    cloud.start()
+
+    hass = await async_start_hass(workdir)
+    # polls would open connections between the bursts
+    entry = benchmark_entry(cloud.url, scan_interval=3600)
+    light_ids = [f"light.{bulb.u_id}" for bulb in fleet.bulbs]
+    started = time.perf_counter()
+    await hass.config_entries.async_add(entry)
+    await async_wait_for_lights(hass, light_ids, started)
+
+    klyqa = hass.data[DOMAIN].entries[entry.entry_id]
+    lights = [klyqa.entities[u_id] for u_id in sorted(klyqa.entities)]
+    unsubscribe = klyqa.timings.subscribe()
+    # let the initial polls of the new lights finish
+    await asyncio.sleep(2)
+
+    async def timed_update(light: Any) -> float:
+        started = time.perf_counter()
+        await light.async_update()
+        return time.perf_counter() - started
+
+    results: list[dict[str, Any]] = []
+    for round_ in range(rounds):
+        klyqa.connection_pool.close()
+        await asyncio.sleep(SETTLE_TIME)
+        klyqa.timings.reset()
+        requests = [bulb.requests for bulb in fleet.bulbs]
+        hits, misses = klyqa.connection_pool.hits, klyqa.connection_pool.misses
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_update(light) for light in lights))
+        seconds = time.perf_counter() - started
+        phases = klyqa.timings.as_dict()["phases"]
+        results.append(
+            {
+                "bulbs": bulbs,
+                "backlog": backlog,
+                "round": round_,
+                "seconds": seconds,
+                "failed": sum(
+                    bulb.requests == before
+                    for bulb, before in zip(fleet.bulbs, requests)
+                ),
+                "accepted": klyqa.connection_pool.misses - misses,
+                "pooled": klyqa.connection_pool.hits - hits,
+                "update_p50_ms": (percentile(latencies, 0.5) or 0) * 1000,
+                "update_p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+                "update_max_ms": max(latencies) * 1000,
+                "connect_p99_ms": phases.get("connect", {}).get("p99_ms"),
+                "discovery_p50_ms": phases.get("discovery", {}).get("p50_ms"),
+                "discovery_max_ms": phases.get("discovery", {}).get("max_ms"),
+            }
+        )
+
+    unsubscribe()
+    await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_stop(force=True)
+    fleet.stop_thread()
+    cloud.stop()
+    return results
+
+
+def print_results(results: list[dict[str, Any]]) -> None:
+    """Print the burst results as table."""
+    columns = (
+        ("bulbs", 5, "d"),
+        ("backlog", 7, "d"),
+        ("round", 5, "d"),
+        ("seconds", 8, ".3f"),
+        ("failed", 6, "d"),
+        ("accepted", 8, "d"),
+        ("pooled", 6, "d"),
+        ("update_p50_ms", 13, ".1f"),
+        ("update_p99_ms", 13, ".1f"),
+        ("update_max_ms", 13, ".1f"),
+        ("connect_p99_ms", 14, ".1f"),
+        ("discovery_p50_ms", 16, ".1f"),
+        ("discovery_max_ms", 16, ".1f"),
+    )
+    print(" ".join(f"{name:>{width}}" for name, width, _ in columns))
+    for item in results:
+        print(
+            " ".join(
+                f"{item[name] or 0:>{width}{spec}}" for name, width, spec in columns
+            )
+        )
+
+
+def main() -> None:
+    """Run the bursts for each fleet size and backlog."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulbs", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--backlogs", type=int, nargs="+", default=[1, 128])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print raw json")
+    parser.add_argument("--child", type=int, nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        bulbs, backlog = args.child
+        workdir = prepare_child("bench_accept")
+        print(
+            json.dumps(asyncio.run(async_bench(bulbs, backlog, args.rounds, workdir)))
+        )
+        return
+
+    results: list[dict[str, Any]] = []
+    for bulbs in args.bulbs:
+        for backlog in args.backlogs:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--child",
+                    str(bulbs),
+                    str(backlog),
+                    "--rounds",
+                    str(args.rounds),
+                ],
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            ).stdout
+            results.extend(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark building the arguments of a bulb command.
+
+Compares KlyqaCommand with the klyqa_ctl argparse path the lights used
+before, which built a new parser and parsed the CLI arguments for every
+send, and with parsing the arguments with a parser built once.
+
+Usage: python benchmarks/bench_command.py [--number 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "klyqa"
+U_ID = "00000000000000000001"
+
+
+def main() -> None:
+    """Time the ways of building the arguments of a turn on command."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="klyqa-bench-")
+    os.makedirs(os.path.join(workdir, "custom_components"))
+    os.symlink(REPO, os.path.join(workdir, "custom_components", DOMAIN))
+    sys.path.insert(0, workdir)
+    # pylint: disable=import-outside-toplevel
+    from klyqa_ctl import klyqa_ctl as api
+
+    from custom_components.klyqa.command import KlyqaCommand
+
+    def build_parser() -> argparse.ArgumentParser:
+        parser = api.get_description_parser()
+        api.add_config_args(parser=parser)
+        api.add_command_args(parser=parser)
+        return parser
+
+    cli_args = ["--power", "on", "--brightness", "80", "--transitionTime", "500"]
+    cached_parser = build_parser()
+
+    def argparse_per_call() -> None:
+        build_parser().parse_args(args=[*cli_args, "--local", "--bulb_unitids", U_ID])
+
+    def argparse_cached() -> None:
+        cached_parser.parse_args(args=[*cli_args, "--local", "--bulb_unitids", U_ID])
+
+    def klyqa_command() -> None:
+        command = KlyqaCommand().power(True).brightness(80).transition(500)
+        command.args_parsed([U_ID])
+        command.args_in([U_ID])
+
+    print(f"{'path':>18} {'us_per_command':>14}")
+    for name, func in (
+        ("argparse_per_call", argparse_per_call),
+        ("argparse_cached", argparse_cached),
+        ("klyqa_command", klyqa_command),
+    ):
+        number = args.number if func is not argparse_per_call else args.number // 10
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:>18} {seconds / number * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
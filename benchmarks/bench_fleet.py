@@ -0,0 +1,416 @@
+"""Benchmark the Klyqa integration against a simulated bulb fleet.
+
+Starts Home Assistant with the integration as custom component, a stub
+cloud api and N simulated bulbs on loopback addresses, sets up a config
+entry and drives the lights:
+
+    startup   config entry setup until all light entities are available
+    turn_on   KlyqaLight.async_turn_on of all lights at once
+    update    KlyqaLight.async_update of all lights at once
+    group     switching all light groups at once
+
+For each scenario the throughput, the p50 and p99 latency and the time the
+event loop was blocked are reported. Every fleet size runs in its own
+process.
+
+With --blocking MS the functions of the integration are watched and the
+ones that held the event loop longer than MS milliseconds are listed, the
+benchmark then exits with 1 if there were any.
+
+With --separate-frames the lights send the lamp attributes and the power
+on in two sends, like before the combined request frames.
+
+Usage: python benchmarks/bench_fleet.py [--bulbs 10 100 500] [--rounds 3]
+           [--blocking MS] [--separate-frames]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+import importlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "klyqa"
+LOOP_CHECK_INTERVAL = 0.005
+LOOP_BLOCK_THRESHOLD = 0.01
+"""seconds a loop iteration may be late before it counts as blocked"""
+STARTUP_TIMEOUT = 300.0
+
+
+class LoopMonitor:
+    """Measure how long the event loop was blocked."""
+
+    def __init__(self) -> None:
+        """Initialize the monitor."""
+        self.blocked = 0.0
+        self.max_block = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start measuring."""
+        self.blocked = 0.0
+        self.max_block = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop measuring."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(LOOP_CHECK_INTERVAL)
+            late = time.perf_counter() - before - LOOP_CHECK_INTERVAL
+            if late > LOOP_BLOCK_THRESHOLD:
+                self.blocked += late
+                self.max_block = max(self.max_block, late)
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """Return the value at the fraction of the sorted values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def result(
+    name: str, latencies: list[float], seconds: float, monitor: LoopMonitor
+) -> dict[str, Any]:
+    """Return the metrics of a scenario run."""
+    return {
+        "scenario": name,
+        "ops": len(latencies),
+        "seconds": seconds,
+        "ops_per_s": len(latencies) / seconds if seconds else None,
+        "p50_ms": (percentile(latencies, 0.5) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+        "loop_blocked_ms": monitor.blocked * 1000,
+        "loop_max_block_ms": monitor.max_block * 1000,
+    }
+
+
+async def run_scenario(
+    name: str,
+    calls: list[Callable[[], Awaitable[Any]]],
+    monitor: LoopMonitor,
+) -> dict[str, Any]:
+    """Run the calls at once and measure each of them."""
+
+    async def timed(call: Callable[[], Awaitable[Any]]) -> float:
+        started = time.perf_counter()
+        await call()
+        return time.perf_counter() - started
+
+    monitor.start()
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(call) for call in calls))
+    seconds = time.perf_counter() - started
+    monitor.stop()
+    return result(name, list(latencies), seconds, monitor)
+
+
+async def async_start_hass(workdir: str) -> Any:
+    """Start Home Assistant with the integration set up."""
+    # pylint: disable=import-outside-toplevel
+    from homeassistant import bootstrap, config_entries, loader
+    from homeassistant.core import HomeAssistant
+    from homeassistant.setup import async_setup_component
+
+    hass = HomeAssistant(workdir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    # the network dependency needs the http server, the benchmark doesn't
+    hass.config.components.add("network")
+    await hass.async_start()
+    await async_setup_component(hass, DOMAIN, {})
+    return hass
+
+
+def benchmark_entry(host: str, polling: bool = True, scan_interval: int = 30) -> Any:
+    """Return the config entry of the benchmark account."""
+    # pylint: disable=import-outside-toplevel
+    from homeassistant import config_entries
+    from homeassistant.const import (
+        CONF_HOST,
+        CONF_PASSWORD,
+        CONF_SCAN_INTERVAL,
+        CONF_USERNAME,
+    )
+
+    return config_entries.ConfigEntry(
+        version=1,
+        minor_version=1,
+        domain=DOMAIN,
+        title="benchmark",
+        data={
+            CONF_USERNAME: "benchmark@example.com",
+            CONF_PASSWORD: "benchmark",
+            CONF_HOST: host,
+            CONF_SCAN_INTERVAL: scan_interval,
+            "sync_rooms": True,
+            "polling": polling,
+        },
+        source=config_entries.SOURCE_USER,
+        unique_id="benchmark@example.com",
+    )
+
+
+async def async_wait_for_lights(
+    hass: Any, light_ids: list[str], started: float
+) -> dict[str, float]:
+    """Wait for the light entities, return the seconds until each appeared."""
+    appeared: dict[str, float] = {}
+    while len(appeared) < len(light_ids):
+        now = time.perf_counter()
+        if now - started > STARTUP_TIMEOUT:
+            break
+        for entity_id in light_ids:
+            if entity_id not in appeared and hass.states.get(entity_id) is not None:
+                appeared[entity_id] = now - started
+        await asyncio.sleep(0.01)
+    return appeared
+
+
+async def async_bench(
+    bulbs: int,
+    rounds: int,
+    workdir: str,
+    blocking_ms: float | None,
+    separate_frames: bool = False,
+) -> list[dict[str, Any]]:
+    """Run the scenarios against a fleet of the given size."""
+    # pylint: disable=import-outside-toplevel
+    from simulator import SimulatedFleet, StubCloud
+
+    fleet = SimulatedFleet(bulbs)
+    fleet.start_in_thread()
+    cloud = StubCloud(
+        fleet, fleet.account_settings(rooms=10, groups=max(1, bulbs // 10))
+    )
+    cloud.start()
+
+    hass = await async_start_hass(workdir)
+    if blocking_ms is not None:
+        from custom_components.klyqa import blocking_classes
+
+        hass.data[DOMAIN].blocking.enable(blocking_classes(), blocking_ms)
+    if separate_frames:
+        from custom_components.klyqa.light import KlyqaLight
+
+        KlyqaLight.supports_combined_frame = lambda self, command: False
+
+    monitor = LoopMonitor()
+    results: list[dict[str, Any]] = []
+
+    entry = benchmark_entry(cloud.url)
+    light_ids = [f"light.{bulb.u_id}" for bulb in fleet.bulbs]
+    monitor.start()
+    started = time.perf_counter()
+    await hass.config_entries.async_add(entry)
+    appeared = await async_wait_for_lights(hass, light_ids, started)
+    seconds = time.perf_counter() - started
+    monitor.stop()
+    results.append(result("startup", list(appeared.values()), seconds, monitor))
+
+    klyqa = hass.data[DOMAIN].entries[entry.entry_id]
+    lights = [klyqa.entities[u_id] for u_id in sorted(klyqa.entities)]
+    groups = list(klyqa.group_entities.values())
+    # let the initial polls of the new lights finish
+    await asyncio.sleep(2)
+
+    for round_ in range(rounds):
+        brightness = 60 + 60 * round_
+        results.append(
+            await run_scenario(
+                "turn_on",
+                [
+                    lambda light=light: light.async_turn_on(brightness=brightness)
+                    for light in lights
+                ],
+                monitor,
+            )
+        )
+    for _ in range(rounds):
+        results.append(
+            await run_scenario(
+                "update", [light.async_update for light in lights], monitor
+            )
+        )
+    for round_ in range(rounds):
+        results.append(
+            await run_scenario(
+                "group",
+                [
+                    group.async_turn_off if round_ % 2 else group.async_turn_on
+                    for group in groups
+                ],
+                monitor,
+            )
+        )
+
+    for item in results:
+        item["bulbs"] = bulbs
+    results.append(
+        {
+            "scenario": "totals",
+            "bulbs": bulbs,
+            "bulb_requests": fleet.requests,
+            "cloud_requests": cloud.requests,
+            "pool_hits": klyqa.connection_pool.hits,
+            "pool_misses": klyqa.connection_pool.misses,
+            "blocking": hass.data[DOMAIN].blocking.as_dict()["flagged"],
+            "setup": klyqa.timings.as_dict()["phases"].get("setup"),
+        }
+    )
+
+    await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_stop(force=True)
+    fleet.stop_thread()
+    cloud.stop()
+    return results
+
+
+def prepare_child(name: str) -> str:
+    """Prepare the process to run the integration, return its workdir."""
+    workdir = tempfile.mkdtemp(prefix="klyqa-bench-")
+    os.makedirs(os.path.join(workdir, "custom_components"))
+    os.symlink(REPO, os.path.join(workdir, "custom_components", DOMAIN))
+    sys.path.insert(0, workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # klyqa_ctl keeps its caches next to the running script
+    sys.argv[0] = os.path.join(workdir, name)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 8192)), hard))
+    logging.basicConfig(level=logging.WARNING)
+    # klyqa_ctl sets its log level when imported
+    importlib.import_module("klyqa_ctl.klyqa_ctl")
+
+    for logger in (f"custom_components.{DOMAIN}", "klyqa_ctl"):
+        logging.getLogger(logger).setLevel(logging.WARNING)
+
+    return workdir
+
+
+def run_child(
+    bulbs: int, rounds: int, blocking_ms: float | None, separate_frames: bool
+) -> list[dict[str, Any]]:
+    """Run one fleet size with the integration as custom component."""
+    workdir = prepare_child("bench_fleet")
+    return asyncio.run(
+        async_bench(bulbs, rounds, workdir, blocking_ms, separate_frames)
+    )
+
+
+def print_results(results: list[dict[str, Any]]) -> None:
+    """Print the scenario results as table."""
+    columns = (
+        ("bulbs", 5, "d"),
+        ("scenario", 8, ""),
+        ("ops", 5, "d"),
+        ("seconds", 8, ".3f"),
+        ("ops_per_s", 9, ".1f"),
+        ("p50_ms", 8, ".1f"),
+        ("p99_ms", 8, ".1f"),
+        ("loop_blocked_ms", 15, ".1f"),
+        ("loop_max_block_ms", 17, ".1f"),
+    )
+    print(" ".join(f"{name:>{width}}" for name, width, _ in columns))
+    for item in results:
+        if item["scenario"] == "totals":
+            print(
+                f"{item['bulbs']:>5} totals   bulb requests {item['bulb_requests']},"
+                f" cloud requests {item['cloud_requests']},"
+                f" pool hits {item['pool_hits']}, misses {item['pool_misses']}"
+            )
+            if item["setup"]:
+                print(
+                    f"{item['bulbs']:>5} setup    lights with first states"
+                    f" {item['setup']['max_ms']:.1f} ms after the platform setup"
+                    f" started, {item['setup']['count']} batches"
+                )
+            for name, stats in item["blocking"].items():
+                print(
+                    f"{item['bulbs']:>5} blocking {name}: {stats['count']} times,"
+                    f" total {stats['total_ms']:.1f} ms, max {stats['max_ms']:.1f} ms"
+                )
+            continue
+        print(
+            " ".join(
+                f"{item[name] or 0:>{width}{spec}}" for name, width, spec in columns
+            )
+        )
+
+
+def main() -> None:
+    """Run the benchmark for each fleet size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulbs", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument(
+        "--blocking",
+        type=float,
+        metavar="MS",
+        help="list the functions holding the event loop longer than MS",
+    )
+    parser.add_argument(
+        "--separate-frames",
+        action="store_true",
+        help="send the lamp attributes and the power on separately",
+    )
+    parser.add_argument("--json", action="store_true", help="print raw json")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(
+            json.dumps(
+                run_child(args.child, args.rounds, args.blocking, args.separate_frames)
+            )
+        )
+        return
+
+    results: list[dict[str, Any]] = []
+    for bulbs in args.bulbs:
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--child",
+                str(bulbs),
+                "--rounds",
+                str(args.rounds),
+                *(["--blocking", str(args.blocking)] if args.blocking else []),
+                *(["--separate-frames"] if args.separate_frames else []),
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+        results.extend(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    if any(item.get("blocking") for item in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark looking up the settings of the bulbs in the account settings.
+
+Compares the scans of the account settings each light did for its device
+settings and rooms with HAKlyqaAccount.build_indexes and the lookups in
+the built tables, for one settings update of every device.
+
+Usage: python benchmarks/bench_indexes.py [--devices 500] [--rooms 50]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "klyqa"
+
+
+def main() -> None:
+    """Time the scans and the indexes for every device of the account."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--rooms", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="klyqa-bench-")
+    os.makedirs(os.path.join(workdir, "custom_components"))
+    os.symlink(REPO, os.path.join(workdir, "custom_components", DOMAIN))
+    sys.path.insert(0, workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # pylint: disable=import-outside-toplevel
+    from klyqa_ctl import klyqa_ctl as api
+
+    from custom_components.klyqa.datacoordinator import HAKlyqaAccount
+    from simulator import SimulatedFleet
+
+    fleet = SimulatedFleet(args.devices)
+    settings = fleet.account_settings(rooms=args.rooms, groups=args.devices // 10)
+    u_ids = [bulb.u_id for bulb in fleet.bulbs]
+
+    def scan(u_id: str) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+        device_result = [
+            x
+            for x in settings["devices"]
+            if api.format_uid(str(x["localDeviceId"])) == u_id
+        ]
+        rooms = []
+        for room in settings["rooms"]:
+            for device in room["devices"]:
+                if device and api.format_uid(device["localDeviceId"]) == u_id:
+                    rooms.append(room)
+        return (device_result[0] if device_result else None), rooms
+
+    account = HAKlyqaAccount(None, None)
+    account.acc_settings = settings
+
+    started = time.perf_counter()
+    scanned = [scan(u_id) for u_id in u_ids]
+    scan_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    account.build_indexes()
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    indexed = [
+        (account.device_index.get(u_id), account.room_index.get(u_id, []))
+        for u_id in u_ids
+    ]
+    lookup_seconds = time.perf_counter() - started
+    assert indexed == scanned
+
+    print(f"{args.devices} devices, {args.rooms} rooms, one update of every device")
+    print(f"{'scans':>14} {scan_seconds * 1000:>10.2f} ms")
+    print(f"{'index build':>14} {build_seconds * 1000:>10.2f} ms")
+    print(f"{'index lookups':>14} {lookup_seconds * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark the logging overhead of a light command.
+
+Compares the log calls of a command before the rate limited bulb log,
+with the package logger at WARNING (the Home Assistant default) and at
+DEBUG, both writing to os.devnull. The old calls format their arguments
+before the level check and go through the stream handler const.py
+attached, the new ones check the level first and log the repetitive
+messages of a bulb at most LOG_RATE_BURST times per interval.
+
+Usage: python benchmarks/bench_logging.py [--commands 100000] [--bulbs 50]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "klyqa"
+
+
+class Light:
+    """Light entity with the attributes the log calls use."""
+
+    def __init__(self, index: int) -> None:
+        """Initialize the light."""
+        self.u_id = f"{index:020x}"
+        self.entity_id = f"light.{self.u_id}"
+        self._name = f"Bulb {index}"
+
+    @property
+    def name(self) -> str:
+        """Return the name of the light."""
+        return self._name
+
+
+def old_command(logger: logging.Logger, light: Light, command: Any) -> None:
+    """Log a command like the light did before."""
+    logger.info(
+        "Send to bulb %s%s: %s",
+        light.entity_id,
+        f" ({light.name})" if light.name else "",
+        command,
+    )
+    logger.debug("Send_answer_cb %s", str(light.u_id))
+    logger.debug(
+        "Update bulb state %s%s",
+        str(light.entity_id),
+        " (" + light.name + ")" if light.name else "",
+    )
+
+
+def new_command(bulb_log: Any, light: Light, label: Any, command: Any) -> None:
+    """Log a command like the light does now."""
+    bulb_log.debug(light.u_id, "send", "Send to bulb %s: %s", label, command)
+    bulb_log.debug(light.u_id, "answer", "Send_answer_cb %s", light.u_id)
+    bulb_log.debug(light.u_id, "state", "Update bulb state %s", label)
+
+
+def main() -> None:
+    """Run the old and the new log calls at both levels."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=100000)
+    parser.add_argument("--bulbs", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="klyqa-bench-")
+    os.makedirs(os.path.join(workdir, "custom_components"))
+    os.symlink(REPO, os.path.join(workdir, "custom_components", DOMAIN))
+    sys.path.insert(0, workdir)
+    # pylint: disable=import-outside-toplevel
+    from custom_components.klyqa.command import KlyqaCommand
+    from custom_components.klyqa.logs import KlyqaBulbLog, KlyqaEntityLabel
+
+    devnull = open(os.devnull, "w", encoding="utf-8")  # noqa: SIM115
+    root_handler = logging.StreamHandler(devnull)
+    logging.getLogger().addHandler(root_handler)
+    logging.getLogger().setLevel(logging.WARNING)
+    old_handler = logging.StreamHandler(devnull)
+    old_handler.setFormatter(
+        logging.Formatter(
+            "%(asctime)s %(levelname)-8s - %(name)s - %(levelname)s - %(message)s"
+        )
+    )
+    logger = logging.getLogger(f"custom_components.{DOMAIN}")
+    lights = [Light(index) for index in range(args.bulbs)]
+    labels = [KlyqaEntityLabel(light) for light in lights]
+    command = KlyqaCommand().power(True).brightness(80).temperature(3000)
+
+    print(f"{'level':>7} {'logging':>7} {'ns_per_command':>14} {'lines':>7}")
+    for level in (logging.WARNING, logging.DEBUG):
+        logger.setLevel(level)
+        for name in ("old", "new"):
+            if name == "old":
+                logger.addHandler(old_handler)
+            bulb_log = KlyqaBulbLog(logger)
+            emitted = 0
+
+            def count(record: logging.LogRecord) -> bool:
+                nonlocal emitted
+                emitted += 1
+                return True
+
+            root_handler.addFilter(count)
+            started = time.perf_counter()
+            for index in range(args.commands):
+                light = lights[index % len(lights)]
+                if name == "old":
+                    old_command(logger, light, command)
+                else:
+                    new_command(bulb_log, light, labels[index % len(lights)], command)
+            seconds = time.perf_counter() - started
+            root_handler.removeFilter(count)
+            logger.removeHandler(old_handler)
+            print(
+                f"{logging.getLevelName(level):>7} {name:>7}"
+                f" {seconds / args.commands * 1e9:>14.0f} {emitted:>7}"
+            )
+    devnull.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Simulated Klyqa bulbs and cloud for the benchmarks."""
+from __future__ import annotations
+
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import socket
+import threading
+from typing import Any
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+
+UDP_PORT = 2222
+TCP_PORT = 3333
+PRODUCT_ID = "@klyqa.lighting.rgb-cw-ww.e27"
+PRODUCT_CONFIG = {
+    "productId": PRODUCT_ID,
+    "deviceTraits": [
+        {"msg_key": "status"},
+        {"msg_key": "brightness", "value_schema": {"minimum": 0, "maximum": 100}},
+        {"msg_key": "temperature", "value_schema": {"minimum": 2000, "maximum": 6500}},
+        {"msg_key": "color"},
+    ],
+}
+IDLE_TIMEOUT = 30.0
+"""seconds a simulated bulb keeps an unused connection open"""
+
+
+def frame(pkg_type: int, pkg: bytes) -> bytes:
+    """Return the pkg with the local protocol header."""
+    return bytes([len(pkg) // 256, len(pkg) % 256, 0, pkg_type]) + pkg
+
+
+class SimulatedBulb:
+    """Klyqa bulb speaking the local protocol on its own loopback address.
+
+    On QCX-SYN the bulb connects to the tcp port of the sender, sends its
+    ident, exchanges the aes ivs and answers every request with its state.
+    """
+
+    def __init__(self, index: int, host: str = "127.0.0.1") -> None:
+        """Initialize the bulb."""
+        self.u_id = f"{index:020x}"
+        self.ip = f"127.1.{index // 200}.{index % 200 + 1}"
+        self.host = host
+        self.aes_key = get_random_bytes(16)
+        self.connected = False
+        self.requests = 0
+        self.state: dict[str, Any] = {
+            "type": "status",
+            "status": "off",
+            "brightness": {"percentage": 50},
+            "mode": "cct",
+            "temperature": 2700,
+            "color": {"red": 255, "green": 255, "blue": 255},
+            "active_scene": "0",
+            "open_slots": 10,
+            "fwversion": "1",
+            "sdkversion": "1",
+        }
+        self._tasks: set[asyncio.Task] = set()
+
+    def device_settings(self, index: int) -> dict[str, Any]:
+        """Return the device entry of the bulb in the account settings."""
+        return {
+            "localDeviceId": self.u_id,
+            "cloudDeviceId": f"cloud-{self.u_id}",
+            "productId": PRODUCT_ID,
+            "name": f"Bulb {index}",
+            "aesKey": self.aes_key.hex(),
+            "firmwareVersion": "1",
+            "hardwareRevision": "1",
+        }
+
+    def syn(self) -> None:
+        """Connect to the host like on a received QCX-SYN."""
+        if self.connected:
+            return
+        self.connected = True
+        task = asyncio.create_task(self._async_connection())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def disconnect(self) -> list[asyncio.Task]:
+        """Drop the connection to the host, return the ending tasks."""
+        for task in self._tasks:
+            task.cancel()
+        return list(self._tasks)
+
+    async def _async_connection(self) -> None:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(
+                self.host, TCP_PORT, local_addr=(self.ip, 0)
+            )
+            ident = {
+                "type": "ident",
+                "ident": {
+                    "fw_version": "1",
+                    "fw_build": "1",
+                    "hw_version": "1",
+                    "manufacturer_id": "QConnex",
+                    "product_id": PRODUCT_ID,
+                    "unit_id": self.u_id,
+                },
+            }
+            writer.write(frame(0, json.dumps(ident).encode()))
+            header = await asyncio.wait_for(reader.readexactly(4), IDLE_TIMEOUT)
+            host_iv = await reader.readexactly(header[0] * 256 + header[1])
+            bulb_iv = get_random_bytes(8)
+            writer.write(frame(1, bulb_iv))
+            receiving = AES.new(self.aes_key, AES.MODE_CBC, iv=host_iv + bulb_iv)
+            sending = AES.new(self.aes_key, AES.MODE_CBC, iv=bulb_iv + host_iv)
+            while True:
+                header = await asyncio.wait_for(reader.readexactly(4), IDLE_TIMEOUT)
+                pkg = await reader.readexactly(header[0] * 256 + header[1])
+                if header[3] != 2:
+                    continue
+                request = json.loads(receiving.decrypt(pkg).decode().strip())
+                self.requests += 1
+                self._apply(request)
+                plain = json.dumps(self.state).encode()
+                while len(plain) % 16:
+                    plain += b" "
+                writer.write(frame(2, sending.encrypt(plain)))
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self.connected = False
+            if writer is not None:
+                writer.close()
+
+    def _apply(self, request: dict[str, Any]) -> None:
+        for key in ("status", "brightness", "temperature", "color"):
+            if key in request:
+                self.state[key] = request[key]
+        if "color" in request:
+            self.state["mode"] = "rgb"
+        elif "temperature" in request:
+            self.state["mode"] = "cct"
+
+
+class _Discovery(asyncio.DatagramProtocol):
+    def __init__(self, bulbs: list[SimulatedBulb]) -> None:
+        self.bulbs = bulbs
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        if data == b"QCX-SYN":
+            for bulb in self.bulbs:
+                bulb.syn()
+
+
+class SimulatedFleet:
+    """Simulated bulbs listening for discovery on the loopback interface.
+
+    Every bulb listens on its own loopback address for direct QCX-SYN, a
+    listener on all addresses takes the broadcasts for all bulbs.
+    """
+
+    def __init__(self, count: int) -> None:
+        """Initialize the fleet."""
+        self.bulbs = [SimulatedBulb(index) for index in range(count)]
+        self._transports: list[asyncio.DatagramTransport] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def async_start(self) -> None:
+        """Listen for discovery."""
+        loop = asyncio.get_running_loop()
+        for address, bulbs in [
+            *((bulb.ip, [bulb]) for bulb in self.bulbs),
+            ("0.0.0.0", self.bulbs),
+        ]:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, UDP_PORT))
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda bulbs=bulbs: _Discovery(bulbs), sock=sock
+            )
+            self._transports.append(transport)
+
+    def close(self) -> None:
+        """Stop listening for discovery."""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    async def async_stop(self) -> None:
+        """Stop listening for discovery and drop the bulb connections."""
+        self.close()
+        tasks = [task for bulb in self.bulbs for task in bulb.disconnect()]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def start_in_thread(self) -> None:
+        """Run the fleet on its own event loop in a thread.
+
+        Keeps the work of the simulated bulbs off the event loop that is
+        measured.
+        """
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.async_start(), self._loop).result()
+
+    def stop_thread(self) -> None:
+        """Stop the fleet and its event loop."""
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.async_stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    @property
+    def requests(self) -> int:
+        """Return the requests the bulbs answered."""
+        return sum(bulb.requests for bulb in self.bulbs)
+
+    def account_settings(
+        self, rooms: int = 0, groups: int = 0, group_size: int = 5
+    ) -> dict[str, Any]:
+        """Return account settings with the bulbs, rooms and device groups."""
+        devices = [bulb.device_settings(index) for index, bulb in enumerate(self.bulbs)]
+        return {
+            "devices": devices,
+            "rooms": [
+                {
+                    "id": f"room-{room}",
+                    "name": f"Room {room}",
+                    "devices": [
+                        {"localDeviceId": device["localDeviceId"]}
+                        for device in devices[room::rooms]
+                    ],
+                }
+                for room in range(rooms)
+            ],
+            "deviceGroups": [
+                {
+                    "id": f"{group:020x}",
+                    "name": f"Group {group}",
+                    "devices": devices[group * group_size : (group + 1) * group_size],
+                }
+                for group in range(groups)
+                if devices[group * group_size : (group + 1) * group_size]
+            ],
+        }
+
+
+class StubCloud:
+    """Klyqa cloud api with the account settings of a simulated fleet."""
+
+    def __init__(self, fleet: SimulatedFleet, settings: dict[str, Any]) -> None:
+        """Initialize the stub cloud."""
+        self.settings = settings
+        self.states = {f"cloud-{bulb.u_id}": bulb.state for bulb in fleet.bulbs}
+        self.requests = 0
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        """Return the base url of the cloud api."""
+        assert self._server is not None
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> None:
+        """Serve the api in a thread."""
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _reply(self, data: Any, status: int = 200) -> None:
+                cloud.requests += 1
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/auth/login":
+                    self._reply({"accessToken": "token"})
+                else:
+                    self._reply({}, 404)
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                if self.path == "/settings":
+                    self._reply(cloud.settings)
+                elif self.path.startswith("/config/product/"):
+                    self._reply(PRODUCT_CONFIG)
+                elif self.path.startswith("/device/"):
+                    state = cloud.states.get(self.path.split("/")[2])
+                    if state is None:
+                        self._reply({}, 404)
+                    else:
+                        self._reply({**state, "connected": False})
+                else:
+                    self._reply({}, 404)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop serving the api."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
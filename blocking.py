@@ -0,0 +1,182 @@
+"""Klyqa event loop blocking detection."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Coroutine, Iterable
+import functools
+import inspect
+import time
+from typing import Any
+
+from .const import LOGGER
+
+DEFAULT_BLOCK_THRESHOLD_MS = 20.0
+"""milliseconds a klyqa function may hold the event loop before it is flagged"""
+
+
+class _TimedCoroutine:
+    """Drive a coroutine and measure each of its steps on the event loop."""
+
+    __slots__ = ("_detector", "_name", "_coro")
+
+    def __init__(
+        self, detector: KlyqaBlockingDetector, name: str, coro: Coroutine
+    ) -> None:
+        self._detector = detector
+        self._name = name
+        self._coro = coro
+
+    def __await__(self) -> _TimedCoroutine:
+        return self
+
+    def __iter__(self) -> _TimedCoroutine:
+        return self
+
+    def __next__(self) -> Any:
+        return self.send(None)
+
+    def send(self, value: Any) -> Any:
+        """Run the coroutine until its next suspension."""
+        nested, started = self._detector.measure_start()
+        try:
+            return self._coro.send(value)
+        finally:
+            self._detector.measure_stop(self._name, nested, started)
+
+    def throw(self, *args: Any) -> Any:
+        """Raise the exception in the coroutine."""
+        nested, started = self._detector.measure_start()
+        try:
+            return self._coro.throw(*args)
+        finally:
+            self._detector.measure_stop(self._name, nested, started)
+
+    def close(self) -> None:
+        """Close the coroutine."""
+        self._coro.close()
+
+
+class KlyqaBlockingDetector:
+    """Flag klyqa functions holding the event loop longer than a threshold.
+
+    Once enabled the functions of the given classes are wrapped. Sync
+    functions are measured per call, coroutine functions per step between
+    two suspensions, which is what holds the event loop. Time spent in a
+    wrapped function called from another one counts only for the called
+    one, so the longest steps are attributed to the function responsible.
+    Nothing is wrapped while the detector is off.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the detector."""
+        self.threshold = DEFAULT_BLOCK_THRESHOLD_MS / 1000
+        self.flagged: dict[str, dict[str, float]] = {}
+        """count, total and max milliseconds of the flagged steps by function"""
+        self._wrapped: list[tuple[type, str, Callable]] = []
+        self._depth = 0
+        self._nested = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """Return True while the functions are wrapped."""
+        return bool(self._wrapped)
+
+    def enable(
+        self,
+        classes: Iterable[type],
+        threshold_ms: float = DEFAULT_BLOCK_THRESHOLD_MS,
+    ) -> None:
+        """Wrap the functions defined by the classes."""
+        self.threshold = threshold_ms / 1000
+        for cls in classes:
+            if any(wrapped_cls is cls for wrapped_cls, _, _ in self._wrapped):
+                continue
+            for name, func in list(vars(cls).items()):
+                if name.startswith("__") or not inspect.isfunction(func):
+                    continue
+                if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(
+                    func
+                ):
+                    continue
+                setattr(cls, name, self._wrap(func))
+                self._wrapped.append((cls, name, func))
+        LOGGER.debug(
+            "Klyqa blocking detection on for %d functions, threshold %.1f ms",
+            len(self._wrapped),
+            threshold_ms,
+        )
+
+    def disable(self) -> None:
+        """Restore the wrapped functions."""
+        while self._wrapped:
+            cls, name, func = self._wrapped.pop()
+            setattr(cls, name, func)
+
+    def _wrap(self, func: Callable) -> Callable:
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return await _TimedCoroutine(self, name, func(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            nested, started = self.measure_start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.measure_stop(name, nested, started)
+
+        return wrapper
+
+    def measure_start(self) -> tuple[float, float]:
+        """Start measuring a step, return the time of the enclosing steps."""
+        nested = self._nested
+        self._nested = 0.0
+        self._depth += 1
+        return nested, time.perf_counter()
+
+    def measure_stop(self, name: str, nested: float, started: float) -> None:
+        """Flag the step if it held the loop longer than the threshold."""
+        elapsed = time.perf_counter() - started
+        own = elapsed - self._nested
+        self._depth -= 1
+        self._nested = nested + elapsed if self._depth else 0.0
+        if own >= self.threshold:
+            self._flag(name, own)
+
+    def _flag(self, name: str, seconds: float) -> None:
+        millis = seconds * 1000
+        stats = self.flagged.get(name)
+        if stats is None:
+            stats = self.flagged[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        stats["count"] += 1
+        stats["total_ms"] += millis
+        if millis > stats["max_ms"]:
+            stats["max_ms"] = millis
+            LOGGER.warning("%s held the event loop for %.1f ms", name, millis)
+
+    def reset(self) -> None:
+        """Forget the flagged steps."""
+        self.flagged = {}
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the flagged functions, the longest total first."""
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": round(self.threshold * 1000, 3),
+            "flagged": {
+                name: {
+                    "count": int(stats["count"]),
+                    "total_ms": round(stats["total_ms"], 3),
+                    "max_ms": round(stats["max_ms"], 3),
+                }
+                for name, stats in sorted(
+                    self.flagged.items(), key=lambda item: -item[1]["total_ms"]
+                )
+            },
+        }
@@ -0,0 +1,275 @@
+"""Klyqa bulb commands."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import traceback
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from typing import Any
+
+from klyqa_ctl import klyqa_ctl as api
+
+from .const import LOGGER
+
+FRAME_VALUES = frozenset(
+    {"power", "color", "percent_color", "temperature", "brightness", "transitionTime"}
+)
+"""command values which can be sent together in one request frame"""
+FRAME_MSG_KEYS = {
+    "color": "color",
+    "percent_color": "color",
+    "temperature": "temperature",
+}
+"""device trait message keys of the bulb attributes"""
+COLOR_VALUES = frozenset({"color", "percent_color", "temperature"})
+"""command values which replace each other, the bulb shows only one"""
+
+_parser: argparse.ArgumentParser | None = None
+_default_args: argparse.Namespace | None = None
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Return the klyqa_ctl argument parser, built once per process."""
+    global _parser  # pylint: disable=global-statement
+    if _parser is None:
+        parser = api.get_description_parser()
+        api.add_config_args(parser=parser)
+        api.add_command_args(parser=parser)
+        _parser = parser
+    return _parser
+
+
+def get_default_args() -> argparse.Namespace:
+    """Return the parser defaults, parsed once per process."""
+    global _default_args  # pylint: disable=global-statement
+    if _default_args is None:
+        _default_args = get_parser().parse_args(args=[])
+    return _default_args
+
+
+class KlyqaCommand:
+    """Command for klyqa bulbs.
+
+    Builds the parsed argument namespace for klyqa_ctl directly instead of
+    creating a new parser and parsing CLI strings for every send.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty command."""
+        self._values: dict[str, Any] = {}
+
+    def copy(self) -> KlyqaCommand:
+        """Return a copy of the command."""
+        command = KlyqaCommand()
+        command._values = dict(self._values)
+        return command
+
+    def update(self, command: KlyqaCommand) -> KlyqaCommand:
+        """Merge the values of the newer command into this command."""
+        if COLOR_VALUES.intersection(command._values):
+            for name in COLOR_VALUES:
+                self._values.pop(name, None)
+        self._values.update(command._values)
+        return self
+
+    def __str__(self) -> str:
+        """Return the command as klyqa_ctl arguments."""
+        return " ".join(self.args)
+
+    def __bool__(self) -> bool:
+        """Return true if the command sets anything."""
+        return bool(self._values)
+
+    def _set(self, name: str, value: Any) -> KlyqaCommand:
+        self._values[name] = value
+        return self
+
+    @property
+    def args(self) -> list[str]:
+        """Return the command as klyqa_ctl argument list."""
+        args: list[str] = []
+        for name, value in self._values.items():
+            args.append("--" + name)
+            if isinstance(value, list):
+                args.extend(value)
+            elif value is not True:
+                args.append(str(value))
+        return args
+
+    def power(self, on: bool) -> KlyqaCommand:
+        """Switch the bulb on or off."""
+        state = "on" if on else "off"
+        return self._set("power", [state])
+
+    def brightness(self, percent: int) -> KlyqaCommand:
+        """Set the brightness in percent (0-100)."""
+        value = str(int(percent))
+        return self._set("brightness", [value])
+
+    def color(self, red: int, green: int, blue: int) -> KlyqaCommand:
+        """Set the rgb color (0-255)."""
+        rgb = [str(int(red)), str(int(green)), str(int(blue))]
+        return self._set("color", rgb)
+
+    def percent_color(
+        self, red: int, green: int, blue: int, warm: int, cold: int
+    ) -> KlyqaCommand:
+        """Set colors and white tones in percent (0-100)."""
+        values = [str(int(x)) for x in (red, green, blue, warm, cold)]
+        return self._set("percent_color", values)
+
+    def temperature(self, kelvin: int) -> KlyqaCommand:
+        """Set the color temperature in kelvin."""
+        value = str(int(kelvin))
+        return self._set("temperature", [value])
+
+    def transition(self, transition_ms: int) -> KlyqaCommand:
+        """Set the transition time in milliseconds."""
+        value = str(int(transition_ms))
+        return self._set("transitionTime", [value])
+
+    def routine_put(
+        self, routine_id: int, scene_id: int | str, commands: str
+    ) -> KlyqaCommand:
+        """Store a routine on the bulb."""
+        self._set("routine_id", str(routine_id))
+        self._set("routine_scene", str(scene_id))
+        self._set("routine_commands", commands)
+        return self._set("routine_put", True)
+
+    def routine_start(self, routine_id: int) -> KlyqaCommand:
+        """Start a stored routine on the bulb."""
+        self._set("routine_id", str(routine_id))
+        return self._set("routine_start", True)
+
+    def request(self) -> KlyqaCommand:
+        """Request the bulb status."""
+        return self._set("request", True)
+
+    def clamp(self, ranges: Mapping[str, tuple[int, int]]) -> KlyqaCommand:
+        """Limit the bulb attributes to the value ranges of the bulb.
+
+        Request frames skip the range checks of klyqa_ctl, out of range
+        values are set to the nearest value the bulb takes instead.
+        """
+
+        def limit(value: str, low: int, high: int) -> str:
+            return str(min(max(int(value), low), high))
+
+        values = self._values
+        for name in ("color", "brightness", "temperature"):
+            if name in values and name in ranges:
+                low, high = ranges[name]
+                values[name] = [limit(value, low, high) for value in values[name]]
+        if "percent_color" in values:
+            values["percent_color"] = [
+                limit(value, 0, 100) for value in values["percent_color"]
+            ]
+        return self
+
+    def frame(self) -> dict[str, Any] | None:
+        """Return the command as one local request frame for the bulb.
+
+        Returns None if the command contains parts (routines, status
+        requests) that can't be combined into a single request frame.
+        """
+        if not self._values or not FRAME_VALUES.issuperset(self._values):
+            return None
+        frame: dict[str, Any] = {"type": "request"}
+        values = self._values
+        if "power" in values:
+            frame["status"] = values["power"][0]
+        if "color" in values:
+            red, green, blue = values["color"]
+            frame["color"] = {"red": red, "green": green, "blue": blue}
+        if "percent_color" in values:
+            red, green, blue, warm, cold = values["percent_color"]
+            frame["p_color"] = {
+                "red": red,
+                "green": green,
+                "blue": blue,
+                "warm": warm,
+                "cold": cold,
+            }
+        if "temperature" in values:
+            frame["temperature"] = values["temperature"][0]
+        if "brightness" in values:
+            frame["brightness"] = {"percentage": values["brightness"][0]}
+        if "transitionTime" in values:
+            frame["transitionTime"] = int(values["transitionTime"][0])
+        return frame
+
+    def frame_msg(self) -> tuple[str, int] | None:
+        """Return the request frame as klyqa_ctl message queue entry."""
+        frame = self.frame()
+        if frame is None:
+            return None
+        return (json.dumps(frame), frame.get("transitionTime", 0))
+
+    def msg_keys(self) -> set[str]:
+        """Return the device trait message keys of the bulb attributes set."""
+        return {FRAME_MSG_KEYS[x] for x in self._values if x in FRAME_MSG_KEYS}
+
+    def args_parsed(self, u_ids: Iterable[str]) -> argparse.Namespace:
+        """Return the parsed arguments for sending to the bulb unit ids."""
+        args_parsed = argparse.Namespace(**vars(get_default_args()))
+        for name, value in self._values.items():
+            setattr(args_parsed, name, value)
+        args_parsed.local = True
+        args_parsed.bulb_unitids = [",".join(u_ids)]
+        return args_parsed
+
+    def args_in(self, u_ids: Iterable[str]) -> list[str]:
+        """Return the command as klyqa_ctl argument list for the bulb unit ids."""
+        return [*self.args, "--local", "--bulb_unitids", ",".join(u_ids)]
+
+
+class KlyqaCommandQueue:
+    """Command queue of one bulb.
+
+    Holds at most one transmission to the bulb in flight. Commands arriving
+    meanwhile are merged into one pending command, newer values replace
+    older ones, so fast changes like slider drags send only the latest
+    values. Callers wait until the command carrying their values was sent.
+    """
+
+    def __init__(self, send: Callable[[KlyqaCommand], Awaitable[None]]) -> None:
+        """Initialize the command queue."""
+        self._send = send
+        self._pending: KlyqaCommand | None = None
+        self._waiters: list[asyncio.Future] = []
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        """transmissions to the bulb"""
+        self.coalesced = 0
+        """commands merged into a pending command"""
+
+    async def async_send(self, command: KlyqaCommand) -> None:
+        """Queue the command and wait until it was sent."""
+        if self._pending is None:
+            self._pending = command.copy()
+        else:
+            self._pending.update(command)
+            self.coalesced += 1
+            LOGGER.debug("Coalesced command, %s in total", self.coalesced)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._async_send_pending())
+        await asyncio.shield(waiter)
+
+    async def _async_send_pending(self) -> None:
+        while self._pending is not None:
+            command, self._pending = self._pending, None
+            waiters, self._waiters = self._waiters, []
+            try:
+                self.sent += 1
+                await self._send(command)
+            except Exception:  # pylint: disable=bare-except,broad-except
+                LOGGER.error(traceback.format_exc())
+            finally:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
@@ -111,9 +111,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 polling=self.polling,
                 scan_interval=self.scan_interval,
             )
-            login = await self.hass.async_add_executor_job(klyqa.login)
-            if login:
-                await asyncio.wait_for(login, timeout=30)
+            await asyncio.wait_for(klyqa.login(), timeout=30)
             self.klyqa = klyqa
 
         except Exception as ex:  # pylint: disable=bare-except,broad-except
@@ -261,10 +259,7 @@ class KlyqaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 scan_interval=self.scan_interval,
             )
 
-            login = await self.hass.async_add_executor_job(klyqa.login)
-            if login:
-                await asyncio.wait_for(login, timeout=30)
-            else:
+            if not await asyncio.wait_for(klyqa.login(), timeout=30):
                 raise Exception()
             self.klyqa = klyqa
 
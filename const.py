@@ -3,21 +3,18 @@
 import logging
 
 LOGGER = logging.getLogger(__package__)
-formatter = logging.Formatter(
-    "%(asctime)s %(levelname)-8s - %(name)s - %(levelname)s - %(message)s"
-)
-
-ch = logging.StreamHandler()
-ch.setLevel(level=logging.DEBUG)
-ch.setFormatter(formatter)
-
-LOGGER.addHandler(ch)
 
 DOMAIN = "klyqa"
 
 
 CONF_POLLING = "polling"
 CONF_SYNC_ROOMS = "sync_rooms"
-EVENT_KLYQA_NEW_LIGHT = "klyqa_new_light"
-EVENT_KLYQA_NEW_LIGHT_GROUP = "klyqa_new_light_group"
+CONF_POLL_CONCURRENCY = "poll_concurrency"
+DEFAULT_POLL_CONCURRENCY = 10
+CONF_POLL_MIN_INTERVAL = "poll_min_interval"
+DEFAULT_POLL_MIN_INTERVAL = 10
+CONF_POLL_MAX_INTERVAL = "poll_max_interval"
+DEFAULT_POLL_MAX_INTERVAL = 300
+EVENT_KLYQA_NEW_LIGHTS = "klyqa_new_lights"
+EVENT_KLYQA_NEW_LIGHT_GROUPS = "klyqa_new_light_groups"
 REQUEST_TIMEOUT = 11000
@@ -1,6 +1,6 @@
 """Klyqa datacoordinator."""
 from __future__ import annotations
-from homeassistant.core import HomeAssistant
+from homeassistant.core import Event, HomeAssistant
 from homeassistant.helpers.entity_component import (
     EntityComponent,
     DEFAULT_SCAN_INTERVAL,
@@ -8,18 +8,24 @@ from homeassistant.helpers.entity_component import (
 from homeassistant.helpers import (
     entity_registry as ent_reg,
 )
-from typing import Any
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from typing import Any, NamedTuple
+import asyncio
+import json
 import socket
+import time
+import traceback
 
 from homeassistant.const import Platform
+from Cryptodome.Cipher import AES
 from klyqa_ctl import klyqa_ctl as api
 from .const import (
     DOMAIN,
     LOGGER,
     CONF_POLLING,
     CONF_SYNC_ROOMS,
-    EVENT_KLYQA_NEW_LIGHT,
-    EVENT_KLYQA_NEW_LIGHT_GROUP,
+    EVENT_KLYQA_NEW_LIGHTS,
+    EVENT_KLYQA_NEW_LIGHT_GROUPS,
 )
 from homeassistant.const import (
     CONF_PASSWORD,
@@ -27,10 +33,32 @@ from homeassistant.const import (
     CONF_SCAN_INTERVAL,
     CONF_USERNAME,
 )
-from datetime import timedelta
+from datetime import datetime, timedelta
 import logging
 from homeassistant.components.light import ENTITY_ID_FORMAT
-from homeassistant.util import slugify
+
+UDP_PORT = 2222
+TCP_PORT = 3333
+TCP_BACKLOG = 128
+PEEK_TIMEOUT = 2.0
+BROADCAST_INTERVAL = 1.0
+HANDSHAKE_TIMEOUT = 5.0
+PUSH_RECONNECT_DELAY = 10.0
+"""seconds until a bulb is asked again for a connection for state pushes"""
+GROUP_UNIQUE_ID_PREFIX = ENTITY_ID_FORMAT.format("")
+
+from .addresses import KlyqaAddressCache
+from .blocking import KlyqaBlockingDetector
+from .logs import KlyqaBulbLog
+from .pool import (
+    POOL_IDLE_TIMEOUT,
+    POOL_MAX_SIZE,
+    KlyqaConnectionPool,
+    close_connection,
+)
+from .profiles import KlyqaProductProfiles
+from .rooms import KlyqaRoomSync
+from .timings import KlyqaTimings
 
 
 class HAKlyqaAccount(api.Klyqa_account):  # type: ignore[misc]
@@ -38,11 +66,39 @@ class HAKlyqaAccount(api.Klyqa_account):  # type: ignore[misc]
 
     hass: HomeAssistant | None
 
-    udp: socket.socket
+    udp: asyncio.DatagramTransport
     tcp: socket.socket
     polling: bool
     sync_rooms: bool
     scan_interval_conf: float
+    settings_coordinator: DataUpdateCoordinator | None
+    """fetches the account settings once per interval for all entities"""
+    entities: dict[str, Any]
+    """light entities by bulb unit id"""
+    group_entities: dict[str, Any]
+    """light group entities by device group id"""
+    device_index: dict[str, dict[str, Any]]
+    """device settings by bulb unit id"""
+    room_index: dict[str, list[dict[str, Any]]]
+    """rooms of a bulb by bulb unit id"""
+    group_index: dict[str, list[str]]
+    """member bulb unit ids by device group id"""
+    routine_scenes: dict[str, str]
+    """scene id stored as routine 0 by bulb unit id"""
+    connection_pool: KlyqaConnectionPool
+    """established bulb connections reused for the next messages"""
+    poller: Any
+    """fleet poller scheduling the state requests of the bulbs"""
+    room_sync: KlyqaRoomSync | None
+    """puts the light entities into the areas of their rooms"""
+    timings: KlyqaTimings
+    """duration histograms of the command and poll path"""
+    bulb_log: KlyqaBulbLog
+    """rate limited log of the repetitive messages of the bulbs"""
+    entry_id: str | None
+    """config entry of the account, None for configuration.yaml accounts"""
+    settings_fresh: bool
+    """the account settings come from the cloud, not from the login cache"""
 
     def __init__(
         self,
@@ -59,11 +115,76 @@ class HAKlyqaAccount(api.Klyqa_account):  # type: ignore[misc]
         """HAKlyqaAccount."""
         super().__init__(username, password, host)
         self.hass = hass
+        self.entry_id = None
         self.udp = udp
         self.tcp = tcp
-        self.polling = polling
+        self.connection_pool = KlyqaConnectionPool(on_readable=self._handle_pushed_data)
+        self._push_buffers: dict[str, bytes] = {}
+        self.poller = None
+        self.timings = KlyqaTimings()
+        self.bulb_log = KlyqaBulbLog()
+        self.set_polling(polling)
         self.sync_rooms = sync_rooms
         self.scan_interval_conf = scan_interval
+        self._settings_refresh: asyncio.Task | None = None
+        self.entities = {}
+        self.group_entities = {}
+        self._processed_settings: KlyqaSettingsSnapshot | None = None
+        self.settings_fresh = False
+        self._registry_checked = False
+        self.device_index = {}
+        self.room_index = {}
+        self.group_index = {}
+        self.routine_scenes = {}
+        self._send_wakeup = asyncio.Event()
+        self._connection_tasks: set[asyncio.Task] = set()
+        self._pooled_sends: set[str] = set()
+        self._unicast_syn: dict[str, float] = {}
+        self._connection_timeout = api.DEFAULT_SEND_TIMEOUT_MS / 1000
+        self.settings_coordinator = None
+        self.room_sync = None
+        if hass:
+            self.room_sync = KlyqaRoomSync(hass, self)
+            self.settings_coordinator = DataUpdateCoordinator(
+                hass,
+                LOGGER,
+                name=f"{DOMAIN} account settings {username}",
+                update_method=self.async_refresh_settings,
+                update_interval=self.get_scan_interval(),
+            )
+
+    def get_scan_interval(self) -> timedelta:
+        """Return the scan interval of the account."""
+        if self.scan_interval_conf and self.scan_interval_conf > 0:
+            return timedelta(seconds=self.scan_interval_conf)
+        return DEFAULT_SCAN_INTERVAL
+
+    def set_scan_interval(self, scan_interval: float) -> None:
+        """Set the scan interval of the account."""
+        self.scan_interval_conf = scan_interval
+        if self.settings_coordinator:
+            self.settings_coordinator.update_interval = self.get_scan_interval()
+
+    def set_polling(self, polling: bool) -> None:
+        """Set if the bulbs of the account are polled.
+
+        Without polling the bulb states come from the bulbs pushing them, so
+        the connections of all bulbs are kept open.
+        """
+        self.polling = polling
+        self.connection_pool.idle_timeout = POOL_IDLE_TIMEOUT if polling else None
+        self.connection_pool.max_size = POOL_MAX_SIZE if polling else None
+
+    async def async_refresh_settings(self) -> dict[str, Any]:
+        """Fetch and process the account settings.
+
+        Concurrent callers share the refresh that is already in flight, so the
+        cloud is requested once no matter how many entities ask for it.
+        """
+        if self._settings_refresh is None or self._settings_refresh.done():
+            self._settings_refresh = asyncio.create_task(self.update_account())
+        await asyncio.shield(self._settings_refresh)
+        return self.acc_settings
 
     async def send_to_bulbs(
         self,
@@ -83,6 +204,417 @@ class HAKlyqaAccount(api.Klyqa_account):  # type: ignore[misc]
         )
         return ret
 
+    async def search_and_send_to_bulb(
+        self, timeout_ms: int = api.DEFAULT_SEND_TIMEOUT_MS
+    ) -> None:
+        """Ask the bulbs for a connection while messages are queued.
+
+        Bulbs with a known address get the request directly, the others and
+        bulbs that didn't connect in time by broadcast. The bulbs answer with
+        a tcp connection. Those are accepted by the data coordinator and
+        handed to async_handle_connection.
+        """
+        self._connection_timeout = timeout_ms / 1000
+        try:
+            while True:
+                self._send_wakeup.clear()
+                if not self.message_queue:
+                    self.connection_pool.prune()
+                    await self._send_wakeup.wait()
+                    continue
+
+                discover = self._send_on_pooled_connections()
+                broadcast = self._send_unicast_syn(discover)
+                if broadcast:
+                    try:
+                        LOGGER.debug("Broadcasting QCX-SYN Burst")
+                        self.udp.sendto(
+                            "QCX-SYN".encode("utf-8"), ("255.255.255.255", UDP_PORT)
+                        )
+                    except Exception:  # pylint: disable=bare-except,broad-except
+                        LOGGER.debug("Broadcasting QCX-SYN Burst Exception")
+                        LOGGER.debug(traceback.format_exc())
+
+                try:
+                    await asyncio.wait_for(
+                        self._send_wakeup.wait(), timeout=BROADCAST_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+                await self._async_check_message_ttls()
+        except asyncio.CancelledError:
+            LOGGER.debug("search and send to bulb loop cancelled.")
+            self.message_queue = {}
+            for task in list(self._connection_tasks):
+                task.cancel()
+            self.connection_pool.close()
+
+    async def async_stop(self) -> None:
+        """Stop the send loop and close the bulb connections of the account."""
+        await self.search_and_send_loop_task_stop()
+        for task in list(self._connection_tasks):
+            task.cancel()
+        self.connection_pool.close()
+        self._push_buffers = {}
+
+    async def _async_check_message_ttls(self) -> None:
+        for uid, msgs in list(self.message_queue.items()):
+            for msg in list(msgs):
+                if not await msg.check_msg_ttl() and msg in msgs:
+                    msgs.remove(msg)
+            if not msgs:
+                self.message_queue.pop(uid, None)
+
+    def search_and_send_loop_task_alive(self) -> None:
+        """Wake up the send loop for new messages, restart it if it ended."""
+        if not self.search_and_send_loop_task or self.search_and_send_loop_task.done():
+            LOGGER.debug("search and send loop task created.")
+            self.search_and_send_loop_task = asyncio.create_task(
+                self.search_and_send_to_bulb()
+            )
+        self._send_wakeup.set()
+
+    async def async_handle_connection(
+        self,
+        connection: socket.socket,
+        address: tuple[str, int],
+        u_id: str | None = None,
+    ) -> None:
+        """Handshake and send the queued messages on a new bulb connection."""
+        if self.timings.enabled and u_id in self.message_queue:
+            queued = min(msg.started for msg in self.message_queue[u_id])
+            self.timings.record(
+                "discovery", (datetime.now() - queued).total_seconds(), u_id
+            )
+
+        if u_id and u_id in self.connection_pool:
+            # the bulb gave up its pooled connection, stop watching it before
+            # klyqa_ctl closes it for the new one
+            self.connection_pool.discard(u_id)
+
+        bulb = api.KlyqaBulb()
+        bulb.local.connection = connection
+        bulb.local.address["ip"] = address[0]
+        bulb.local.address["port"] = address[1]
+
+        task = asyncio.current_task()
+        if task:
+            self._connection_tasks.add(task)
+        try:
+            await asyncio.wait_for(
+                self.bulb_handle_local_tcp(bulb), timeout=self._connection_timeout
+            )
+        except asyncio.TimeoutError:
+            LOGGER.debug("Bulb connection %s timed out.", address[0])
+        finally:
+            if task:
+                self._connection_tasks.discard(task)
+
+    def _send_on_pooled_connections(self) -> list[str]:
+        """Send the queued messages on the pooled bulb connections.
+
+        Returns the unit ids with queued messages but without a usable pooled
+        connection, those bulbs need to be asked for a connection.
+        """
+        discover: list[str] = []
+        for u_id in list(self.message_queue):
+            if u_id in self._pooled_sends:
+                continue
+            bulb = self.connection_pool.acquire(u_id)
+            if bulb is None:
+                discover.append(u_id)
+                continue
+            self._pooled_sends.add(u_id)
+            task = asyncio.create_task(self._async_send_pooled(bulb))
+            self._connection_tasks.add(task)
+            task.add_done_callback(self._connection_tasks.discard)
+        return discover
+
+    @property
+    def address_cache(self) -> KlyqaAddressCache | None:
+        """Return the bulb address cache of the integration."""
+        if self.hass and DOMAIN in self.hass.data:
+            return getattr(self.hass.data[DOMAIN], "addresses", None)
+        return None
+
+    def _send_unicast_syn(self, u_ids: list[str]) -> bool:
+        """Ask the bulbs with a known address for a connection directly.
+
+        Returns true if a broadcast is needed, because a bulb has no known
+        address or didn't connect after the direct request.
+        """
+        for u_id in list(self._unicast_syn):
+            if u_id not in self.message_queue:
+                del self._unicast_syn[u_id]
+        cache = self.address_cache
+        now = time.monotonic()
+        broadcast = False
+        for u_id in u_ids:
+            ip = cache.get(u_id) if cache else None
+            if u_id in self._unicast_syn:
+                if now - self._unicast_syn[u_id] >= BROADCAST_INTERVAL:
+                    broadcast = True
+                continue
+            if ip is None:
+                broadcast = True
+                continue
+            self._unicast_syn[u_id] = now
+            try:
+                LOGGER.debug("Sending QCX-SYN to bulb %s at %s", u_id, ip)
+                self.udp.sendto("QCX-SYN".encode("utf-8"), (ip, UDP_PORT))
+            except Exception:  # pylint: disable=bare-except,broad-except
+                LOGGER.debug(traceback.format_exc())
+                broadcast = True
+        return broadcast
+
+    async def _async_send_pooled(self, bulb: api.KlyqaBulb) -> None:
+        """Send the next queued message on the pooled connection of the bulb."""
+        try:
+            if not await bulb.use_lock():
+                close_connection(bulb)
+                return
+            await asyncio.wait_for(
+                self.bulb_handle_local_tcp(bulb, pooled=True),
+                timeout=self._connection_timeout,
+            )
+        except asyncio.TimeoutError:
+            LOGGER.debug("Pooled connection to bulb %s timed out.", bulb.u_id)
+            close_connection(bulb)
+        finally:
+            await bulb.use_unlock()
+            self._pooled_sends.discard(bulb.u_id)
+            self._send_wakeup.set()
+
+    async def bulb_handle_local_tcp(
+        self, bulb: api.KlyqaBulb, pooled: bool = False
+    ) -> Any:
+        """Send the next queued message to the bulb on its connection.
+
+        Handshakes first on new connections. Unlike klyqa_ctl, the connection
+        is not closed after the answer but kept in the connection pool.
+        """
+        return_state = api.Bulb_TCP_return.nothing_done
+        r_bulb = api.RefParse(bulb)
+        r_msg = api.RefParse(None)
+        started = self.timings.start()
+        try:
+            return_state = await self.aes_handshake_and_send_msgs(r_bulb, r_msg)
+        except asyncio.CancelledError:
+            LOGGER.debug("Local send to bulb %s cancelled.", bulb.u_id)
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.debug(traceback.format_exc())
+
+        bulb = r_bulb.ref
+        msg_sent: api.Message | None = r_msg.ref
+        if msg_sent:
+            self.timings.stop(
+                "exchange_pooled" if pooled else "exchange", started, bulb.u_id
+            )
+            if pooled:
+                self.connection_pool.hits += 1
+            else:
+                self.connection_pool.misses += 1
+            if msg_sent.callback is not None:
+                try:
+                    await msg_sent.callback(msg_sent, bulb.u_id)
+                except Exception:  # pylint: disable=bare-except,broad-except
+                    LOGGER.error(traceback.format_exc())
+
+        if (
+            return_state == api.Bulb_TCP_return.answered
+            and bulb.local.state == "CONNECTED"
+            and bulb.u_id in self.bulbs
+        ):
+            self.connection_pool.put(bulb)
+            self._unicast_syn.pop(bulb.u_id, None)
+            cache = self.address_cache
+            if cache and not pooled:
+                cache.update(
+                    bulb.u_id, bulb.local.address["ip"], bulb.local.address["port"]
+                )
+        else:
+            self.connection_pool.discard(bulb.u_id)
+            close_connection(bulb)
+
+        if bulb.u_id in self.bulbs:
+            await self.bulbs[bulb.u_id].use_unlock()
+        return return_state
+
+    async def async_handle_push_connection(
+        self, connection: socket.socket, address: tuple[str, int]
+    ) -> None:
+        """Key a bulb connection without queued messages for state pushes.
+
+        The keyed connection goes to the connection pool, which hands the
+        state frames the bulb sends to _handle_pushed_data.
+        """
+        loop = asyncio.get_running_loop()
+        new_bulb = api.KlyqaBulb()
+        new_bulb.local.connection = connection
+        new_bulb.local.address["ip"] = address[0]
+        new_bulb.local.address["port"] = address[1]
+        try:
+            pkg_type, pkg = await _async_recv_frame(loop, connection)
+            if pkg_type != 0:
+                raise ValueError("no ident package")
+            ident = json.loads(pkg)
+            u_id = api.format_uid(ident["ident"]["unit_id"])
+            aes_key = api.AES_KEYs.get("all") or api.AES_KEYs.get(u_id)
+            if not aes_key or u_id not in self.entities:
+                raise ValueError(f"no light for bulb {u_id}")
+            bulb: api.KlyqaBulb = self.bulbs.setdefault(u_id, new_bulb)
+            bulb.u_id = u_id
+            bulb.save_bulb_message(ident)
+        except (asyncio.TimeoutError, OSError, ValueError, KeyError, TypeError) as err:
+            LOGGER.debug("Push connection from %s refused: %s", address[0], err)
+            connection.close()
+            return
+
+        if not await bulb.use_lock():
+            connection.close()
+            return
+        started = self.timings.start()
+        try:
+            self.connection_pool.discard(u_id)
+            if bulb is not new_bulb:
+                close_connection(bulb)
+                bulb.local = new_bulb.local
+            await loop.sock_sendall(
+                connection, bytes([0, 8, 0, 1]) + bulb.local.localIv
+            )
+            pkg_type, remote_iv = await _async_recv_frame(loop, connection)
+            if pkg_type != 1:
+                raise ValueError("no iv package")
+            bulb.remoteIv = remote_iv
+            bulb.local.sendingAES = AES.new(
+                aes_key, AES.MODE_CBC, iv=bulb.local.localIv + remote_iv
+            )
+            bulb.local.receivingAES = AES.new(
+                aes_key, AES.MODE_CBC, iv=remote_iv + bulb.local.localIv
+            )
+            bulb.local.state = "CONNECTED"
+            self.timings.stop("handshake", started, u_id)
+            self._push_buffers.pop(u_id, None)
+            self.connection_pool.put(bulb)
+            LOGGER.debug("Bulb %s connected for state pushes.", u_id)
+        except (asyncio.TimeoutError, OSError, ValueError) as err:
+            LOGGER.debug("Push connection to bulb %s failed: %s", u_id, err)
+            close_connection(bulb)
+        finally:
+            await bulb.use_unlock()
+
+    def _handle_pushed_data(self, bulb: api.KlyqaBulb) -> None:
+        """Read the data the bulb sent on its pooled connection."""
+        u_id = bulb.u_id
+        try:
+            data = bulb.local.connection.recv(4096)
+        except (BlockingIOError, InterruptedError, socket.timeout):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            LOGGER.debug("Bulb %s closed the connection.", u_id)
+            self._push_buffers.pop(u_id, None)
+            self.connection_pool.discard(u_id)
+            if not self.polling and self.hass:
+                self.hass.async_create_task(self._async_reconnect_for_pushes(u_id))
+            return
+
+        data = self._push_buffers.pop(u_id, b"") + data
+        while len(data) >= 4 and len(data) >= 4 + data[0] * 256 + data[1]:
+            pkg_len = data[0] * 256 + data[1]
+            pkg_type = data[3]
+            pkg = data[4 : 4 + pkg_len]
+            data = data[4 + pkg_len :]
+            if pkg_type == 2:
+                self._handle_pushed_frame(bulb, pkg)
+        if data:
+            self._push_buffers[u_id] = data
+
+    async def _async_reconnect_for_pushes(self, u_id: str) -> None:
+        """Request the bulb state, so the bulb connects again for pushes."""
+        await asyncio.sleep(PUSH_RECONNECT_DELAY)
+        if u_id not in self.entities or u_id in self.connection_pool:
+            return
+        await self.async_request_states([u_id])
+
+    async def async_request_states(self, u_ids: list[str]) -> None:
+        """Request the states of the bulbs and apply them to their lights."""
+        await self.send_frame_to_bulbs(
+            (json.dumps({"type": "request"}), 0),
+            u_ids,
+            async_answer_callback=self.async_apply_answer,
+            timeout_ms=api.DEFAULT_SEND_TIMEOUT_MS,
+        )
+
+    def _handle_pushed_frame(self, bulb: api.KlyqaBulb, pkg: bytes) -> None:
+        """Apply a state frame the bulb sent unsolicited."""
+        try:
+            response = json.loads(bulb.local.receivingAES.decrypt(pkg).decode())
+        except (ValueError, UnicodeDecodeError):
+            LOGGER.debug("Could not decode pushed frame of bulb %s", bulb.u_id)
+            return
+        if response.get("type") != "status":
+            return
+        self.bulb_log.debug(bulb.u_id, "push", "Bulb %s pushed its state.", bulb.u_id)
+        bulb.save_bulb_message(response)
+        if self.hass:
+            self.hass.async_create_task(self.async_apply_answer(None, bulb.u_id))
+
+    async def send_frame_to_bulbs(
+        self,
+        msg: tuple[str, int],
+        u_ids: list[str],
+        args: Any = None,
+        timeout_ms: Any = 5000,
+        async_answer_callback: Any = None,
+    ) -> None:
+        """Send one prepared local message frame to each of the bulbs.
+
+        Skips the command collection of klyqa_ctl, so all values of the frame
+        are delivered to a bulb in a single transmission.
+        """
+        pending = set(u_ids)
+        answered = asyncio.Event()
+
+        async def answer_cb(msg: api.Message, uid: str) -> None:
+            if async_answer_callback is not None:
+                await async_answer_callback(msg, uid)
+            pending.discard(uid)
+            if not pending:
+                answered.set()
+
+        for u_id in u_ids:
+            await self.set_send_message(
+                [msg],
+                u_id,
+                args,
+                callback=answer_cb,
+                time_to_live_secs=(timeout_ms / 1000),
+            )
+
+        try:
+            await asyncio.wait_for(answered.wait(), timeout=timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            LOGGER.debug("No answer from bulbs %s", ", ".join(pending))
+
+    async def async_apply_answer(self, msg: api.Message, uid: str) -> None:
+        """Apply the bulb state of an answer to the light entity of the bulb."""
+        entity: Any = self.entities.get(uid)
+        if entity is None or uid not in self.bulbs:
+            return
+        started = self.timings.start()
+        try:
+            changed = entity._update_state(  # pylint: disable=protected-access
+                self.bulbs[uid].status
+            )
+            if changed and entity._added_klyqa:  # pylint: disable=protected-access
+                entity.async_write_ha_state()
+            self.timings.stop("apply", started, uid)
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.error(traceback.format_exc())
+
     # pylint: disable=arguments-differ
     async def login(self, print_onboarded_lamps=False) -> bool:
         """Login."""
@@ -101,78 +633,314 @@ class HAKlyqaAccount(api.Klyqa_account):  # type: ignore[misc]
             )
         return ret
 
+    async def request_account_settings(self) -> bool:
+        """Request the account settings from the cloud.
+
+        On failure the settings stay as they are, which after the login may be
+        the settings cache of klyqa_ctl.
+        """
+        try:
+            self.acc_settings = await self.request("settings")
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.debug("Couldn't request the settings of %s.", self.username)
+            self.settings_fresh = False
+            return False
+        self.settings_fresh = True
+        return True
+
     async def update_account(self) -> bool:
         """Update_account."""
 
         await self.request_account_settings()
+        self.build_indexes()
         await self.process_account_settings()
 
+    def build_indexes(self) -> None:
+        """Build the device, room and group lookup tables of the settings."""
+        acc_settings = self.acc_settings or {}
+
+        self.device_index = {
+            api.format_uid(str(device["localDeviceId"])): device
+            for device in acc_settings.get("devices", [])
+        }
+
+        room_index: dict[str, list[dict[str, Any]]] = {}
+        for room in acc_settings.get("rooms", []):
+            for device in room["devices"]:
+                if device:
+                    room_index.setdefault(
+                        api.format_uid(device["localDeviceId"]), []
+                    ).append(room)
+        self.room_index = room_index
+
+        self.group_index = {
+            api.format_uid(group["id"]): group_members(group)
+            for group in acc_settings.get("deviceGroups", [])
+        }
+
     async def process_account_settings(self) -> None:
-        """Process_account_settings."""
+        """Act on the changes of the account settings since the last call.
+
+        Fires one event with all added devices and one with all added groups,
+        removes the entities of devices and groups gone from the account and
+        updates the entities of changed devices. Groups with changed members
+        are added again.
+        """
 
         klyqa_new_light_registered = [
             key
             for key, _ in self.hass.bus.async_listeners().items()
-            if key == EVENT_KLYQA_NEW_LIGHT or key == EVENT_KLYQA_NEW_LIGHT_GROUP
+            if key == EVENT_KLYQA_NEW_LIGHTS or key == EVENT_KLYQA_NEW_LIGHT_GROUPS
         ]
-        if len(klyqa_new_light_registered) == 2:
+        if len(klyqa_new_light_registered) != 2:
+            return
 
-            # if EVENT_KLYQA_NEW_LIGHT in self.hass.bus._listeners:
-            ha_entities = self.hass.data["light"].entities
-            entity_registry = ent_reg.async_get(self.hass)
+        snapshot = self._settings_snapshot()
+        previous = self._processed_settings
+        self._processed_settings = snapshot
+        diff = settings_diff(previous, snapshot)
+        if self.settings_fresh and not self._registry_checked:
+            # devices and groups removed while home assistant was down, the
+            # cached settings of an offline start may be outdated
+            self._registry_checked = True
+            removals = self._registered_removals(snapshot)
+            diff = diff._replace(
+                **{
+                    key: list(dict.fromkeys(getattr(diff, key) + u_ids))
+                    for key, u_ids in removals.items()
+                }
+            )
 
-            for device in self.acc_settings["devices"]:
-                # look if any onboarded device is not in the entity registry already
-                u_id = api.format_uid(device["localDeviceId"])
+        for u_id in diff.removed_devices:
+            LOGGER.info("Device %s is gone from the klyqa account.", u_id)
+            await self._async_remove_entity(u_id, self.entities.get(u_id))
 
-                registered_entity_id = entity_registry.async_get_entity_id(
-                    Platform.LIGHT, DOMAIN, u_id
-                )
+        for u_id in diff.removed_groups:
+            LOGGER.info("Device group %s is gone from the klyqa account.", u_id)
+            await self._async_remove_entity(
+                ENTITY_ID_FORMAT.format(u_id), self.group_entities.get(u_id)
+            )
 
-                # light = [
-                #     entity
-                #     for entity in ha_entities
-                #     if hasattr(entity, "u_id") and entity.u_id == u_id
-                # ]
-
-                if (
-                    # not registered_entity_id
-                    not self.hass.states.get(ENTITY_ID_FORMAT.format(u_id))
-                ):  #
-                    # if len(light) == 0:
-                    if device["productId"].startswith("@klyqa.lighting"):
-                        """found klyqa device not in the light entities"""
-                        self.hass.bus.fire(EVENT_KLYQA_NEW_LIGHT, device)
-
-            for group in self.acc_settings["deviceGroups"]:
-                u_id = api.format_uid(group["id"])
-
-                # light = [
-                #     entity
-                #     for entity in ha_entities
-                #     if hasattr(entity, "u_id") and entity.u_id == u_id
-                # ]
-                registered_entity_id = entity_registry.async_get_entity_id(
-                    Platform.LIGHT, DOMAIN, u_id
-                )
+        for u_id in diff.changed_groups:
+            group = self.group_entities.get(u_id)
+            if group is not None and group.hass is not None:
+                LOGGER.info("Device group %s changed, adding it again.", u_id)
+                # the group entity tracks its members from its creation on,
+                # the registry entry and its customizations stay
+                await group.async_remove()
 
-                # if len(light) == 0:
-                if (
-                    # not registered_entity_id
-                    not self.hass.states.get(
-                        ENTITY_ID_FORMAT.format(slugify(group["name"]))
-                    )
-                ):  # self.hass.states.get(ENTITY_ID_FORMAT.format(u_id)):
-                    """found klyqa device not in the light entities"""
-                    if (
-                        len(group["devices"]) > 0
-                        and "productId" in group["devices"][0]
-                        and group["devices"][0]["productId"].startswith(
-                            "@klyqa.lighting"
-                        )
-                    ):
-                        self.hass.bus.fire(EVENT_KLYQA_NEW_LIGHT_GROUP, group)
-        return True
+        devices = [
+            snapshot.devices[u_id]
+            for u_id in diff.added_devices
+            if u_id not in self.entities
+        ]
+        if devices:
+            self.hass.bus.async_fire(
+                EVENT_KLYQA_NEW_LIGHTS,
+                {CONF_USERNAME: self.username, "devices": devices},
+            )
+
+        groups = [
+            snapshot.groups[u_id]
+            for u_id in diff.added_groups + diff.changed_groups
+            if u_id not in self.group_entities
+        ]
+        if groups:
+            self.hass.bus.async_fire(
+                EVENT_KLYQA_NEW_LIGHT_GROUPS,
+                {CONF_USERNAME: self.username, "groups": groups},
+            )
+
+        for u_id in diff.changed_devices:
+            entity = self.entities.get(u_id)
+            if entity is not None and entity.hass is not None:
+                entity.async_schedule_settings_update()
+
+        if self.room_sync is not None:
+            # skipped by the room sync while the rooms are unchanged
+            self.room_sync.async_schedule()
+
+    def forget_processed_devices(self, u_ids: list[str]) -> None:
+        """Report the devices as added again with the next settings update."""
+        if self._processed_settings is None:
+            return
+        for u_id in u_ids:
+            self._processed_settings.devices.pop(u_id, None)
+
+    def _settings_snapshot(self) -> KlyqaSettingsSnapshot:
+        """Return the light devices, groups and rooms of the account settings."""
+        acc_settings = self.acc_settings or {}
+        devices = {
+            u_id: device
+            for u_id, device in self.device_index.items()
+            if device["productId"].startswith("@klyqa.lighting")
+        }
+        groups = {
+            api.format_uid(group["id"]): group
+            for group in acc_settings.get("deviceGroups", [])
+            if group["devices"]
+            and "productId" in group["devices"][0]
+            and group["devices"][0]["productId"].startswith("@klyqa.lighting")
+        }
+        rooms = {
+            u_id: tuple((room["id"], room["name"]) for room in rooms)
+            for u_id, rooms in self.room_index.items()
+        }
+        return KlyqaSettingsSnapshot(devices, groups, rooms)
+
+    def _registered_removals(
+        self, snapshot: KlyqaSettingsSnapshot
+    ) -> dict[str, list[str]]:
+        """Return the registered devices and groups gone from the snapshot."""
+        if self.entry_id is None:
+            return {}
+        removed_devices: list[str] = []
+        removed_groups: list[str] = []
+        for entry in ent_reg.async_entries_for_config_entry(
+            ent_reg.async_get(self.hass), self.entry_id
+        ):
+            if entry.domain != Platform.LIGHT or entry.platform != DOMAIN:
+                continue
+            # groups are registered by entity id, lights by unit id
+            if entry.unique_id.startswith(GROUP_UNIQUE_ID_PREFIX):
+                u_id = entry.unique_id[len(GROUP_UNIQUE_ID_PREFIX) :]
+                if u_id not in snapshot.groups:
+                    removed_groups.append(u_id)
+            elif entry.unique_id not in snapshot.devices:
+                removed_devices.append(entry.unique_id)
+        return {"removed_devices": removed_devices, "removed_groups": removed_groups}
+
+    async def _async_remove_entity(self, unique_id: str, entity: Any) -> None:
+        """Remove the entity from the entity registry and home assistant."""
+        entity_registry = ent_reg.async_get(self.hass)
+        entity_id = entity_registry.async_get_entity_id(
+            Platform.LIGHT, DOMAIN, unique_id
+        )
+        if entity_id:
+            # removing the registry entry removes the entity as well
+            entity_registry.async_remove(entity_id)
+        elif entity is not None and entity.hass is not None:
+            await entity.async_remove()
+
+
+class KlyqaSettingsSnapshot(NamedTuple):
+    """Light devices, groups and rooms of processed account settings."""
+
+    devices: dict[str, dict[str, Any]]
+    groups: dict[str, dict[str, Any]]
+    rooms: dict[str, tuple[tuple[Any, Any], ...]]
+    """room ids and names by bulb unit id"""
+
+
+class KlyqaSettingsDiff(NamedTuple):
+    """Changes between two account settings snapshots."""
+
+    added_devices: list[str]
+    removed_devices: list[str]
+    changed_devices: list[str]
+    added_groups: list[str]
+    removed_groups: list[str]
+    changed_groups: list[str]
+
+
+def settings_diff(
+    old: KlyqaSettingsSnapshot | None, new: KlyqaSettingsSnapshot
+) -> KlyqaSettingsDiff:
+    """Return the changes from the old to the new settings snapshot.
+
+    Devices with changed settings or changed rooms count as changed, groups
+    with changed members or a changed name.
+    """
+    if old is None:
+        old = KlyqaSettingsSnapshot({}, {}, {})
+    return KlyqaSettingsDiff(
+        added_devices=[x for x in new.devices if x not in old.devices],
+        removed_devices=[x for x in old.devices if x not in new.devices],
+        changed_devices=[
+            x
+            for x in new.devices
+            if x in old.devices
+            and (
+                new.devices[x] != old.devices[x] or new.rooms.get(x) != old.rooms.get(x)
+            )
+        ],
+        added_groups=[x for x in new.groups if x not in old.groups],
+        removed_groups=[x for x in old.groups if x not in new.groups],
+        changed_groups=[
+            x
+            for x in new.groups
+            if x in old.groups
+            and (
+                group_members(new.groups[x]) != group_members(old.groups[x])
+                or new.groups[x].get("name") != old.groups[x].get("name")
+            )
+        ],
+    )
+
+
+def group_members(group: dict[str, Any]) -> list[str]:
+    """Return the unit ids of the member bulbs of the device group."""
+    return [
+        api.format_uid(device["localDeviceId"])
+        for device in group["devices"]
+        if device and "localDeviceId" in device
+    ]
+
+
+async def _async_recv_frame(
+    loop: asyncio.AbstractEventLoop,
+    connection: socket.socket,
+    timeout: float = HANDSHAKE_TIMEOUT,
+) -> tuple[int, bytes]:
+    """Receive one unencrypted package of the bulb, return type and content."""
+    data = b""
+    while len(data) < 4 or len(data) < 4 + data[0] * 256 + data[1]:
+        chunk = await asyncio.wait_for(loop.sock_recv(connection, 4096), timeout)
+        if not chunk:
+            raise ConnectionResetError("connection closed by bulb")
+        data += chunk
+    return data[3], data[4 : 4 + data[0] * 256 + data[1]]
+
+
+class KlyqaDatagramProtocol(asyncio.DatagramProtocol):
+    """Udp endpoint for the bulb discovery broadcasts.
+
+    Bulbs answer the broadcast with a tcp connection, so incoming datagrams
+    are ignored.
+    """
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """Ignore incoming datagrams."""
+        LOGGER.debug("UDP datagram from %s ignored", addr[0])
+
+
+async def _async_peek_unit_id(
+    connection: socket.socket, timeout: float = PEEK_TIMEOUT
+) -> str | None:
+    """Read the unit id from the ident package of a new bulb connection.
+
+    The package stays in the socket buffer for the handshake.
+    """
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(
+        connection.fileno(), lambda: readable.done() or readable.set_result(None)
+    )
+    try:
+        await asyncio.wait_for(readable, timeout)
+        data = connection.recv(4096, socket.MSG_PEEK)
+    except (asyncio.TimeoutError, OSError):
+        return None
+    finally:
+        loop.remove_reader(connection.fileno())
+
+    if len(data) < 4 or data[3] != 0:
+        return None
+    pkg = data[4 : 4 + data[0] * 256 + data[1]]
+    try:
+        return api.format_uid(json.loads(pkg)["ident"]["unit_id"])
+    except (ValueError, KeyError, TypeError):
+        return None
 
 
 class KlyqaDataCoordinator(EntityComponent):
@@ -180,23 +948,32 @@ class KlyqaDataCoordinator(EntityComponent):
 
     _instance = None
     klyqa_accounts: dict[str, HAKlyqaAccount]
-    udp: socket.socket
-    tcp: socket.socket
+    udp: asyncio.DatagramTransport | None
+    tcp: socket.socket | None
+    _accept_task: asyncio.Task | None
     remove_listeners: list
+    profiles: KlyqaProductProfiles
+    addresses: KlyqaAddressCache
+    blocking: KlyqaBlockingDetector
 
     # pylint: disable = super-init-not-called
     def __init__(self) -> None:
         """KlyqaDataCoordinator."""
         raise RuntimeError("Call instance() instead")
 
-    def get_ports(self) -> int:
-        """Get_ports."""
+    async def async_get_ports(self) -> int:
+        """Open the udp endpoint and the tcp server for the bulb connections."""
+        loop = asyncio.get_running_loop()
         try:
-            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server_address = ("0.0.0.0", 2222)
-            self.udp.bind(server_address)
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udp.setblocking(False)
+            server_address = ("0.0.0.0", UDP_PORT)
+            udp.bind(server_address)
+            self.udp, _ = await loop.create_datagram_endpoint(
+                KlyqaDatagramProtocol, sock=udp
+            )
             LOGGER.debug("Bound UDP port 2222")
 
         except:  # noqa: E722 pylint: disable=bare-except
@@ -208,18 +985,101 @@ class KlyqaDataCoordinator(EntityComponent):
         try:
             self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server_address = ("0.0.0.0", 3333)
+            self.tcp.setblocking(False)
+            server_address = ("0.0.0.0", TCP_PORT)
             self.tcp.bind(server_address)
             LOGGER.debug("Bound TCP port 3333")
-            self.tcp.listen(1)
+            self.tcp.listen(TCP_BACKLOG)
 
         except:  # noqa: E722 pylint: disable=bare-except
             LOGGER.error(
                 "Error on opening and binding the tcp port 3333 on host for initiating the lamp communication"
             )
             return 1
+
+        self._accept_task = self.hass.async_create_background_task(
+            self._async_accept_connections(), "klyqa accept bulb connections"
+        )
         return 0
 
+    async def async_close_ports(self, event: Event | None = None) -> None:
+        """Stop accepting bulb connections and close the ports."""
+        if self._accept_task:
+            self._accept_task.cancel()
+            self._accept_task = None
+        if self.udp:
+            self.udp.close()
+            self.udp = None
+        if self.tcp:
+            self.tcp.close()
+            self.tcp = None
+
+    async def _async_accept_connections(self) -> None:
+        """Accept incoming bulb connections and dispatch them concurrently."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                connection, address = await loop.sock_accept(self.tcp)
+            except asyncio.CancelledError:
+                raise
+            except OSError:
+                LOGGER.debug("Accept bulb connection failed", exc_info=True)
+                await asyncio.sleep(0.1)
+                continue
+            self.hass.async_create_background_task(
+                self._async_dispatch_connection(connection, address),
+                f"klyqa bulb connection {address[0]}",
+            )
+
+    async def _async_dispatch_connection(
+        self, connection: socket.socket, address: tuple[str, int]
+    ) -> None:
+        """Hand the bulb connection to the account of the bulb."""
+        accepted = time.perf_counter()
+        u_id = await _async_peek_unit_id(connection)
+        account = self.account_for_bulb(u_id)
+        if account is not None:
+            account.timings.stop("connect", accepted, u_id)
+            await account.async_handle_connection(connection, address, u_id)
+            return
+        account = self.account_for_pushes(u_id)
+        if account is not None:
+            account.timings.stop("connect", accepted, u_id)
+            await account.async_handle_push_connection(connection, address)
+            return
+        LOGGER.debug("No messages for bulb %s, close connection.", address[0])
+        connection.close()
+
+    def accounts(self) -> list[HAKlyqaAccount]:
+        """Return the klyqa accounts of the config entries and platforms."""
+        accounts: list[HAKlyqaAccount] = []
+        for account in [*self.entries.values(), *self.klyqa_accounts.values()]:
+            if account and account not in accounts:
+                accounts.append(account)
+        return accounts
+
+    def account_for_pushes(self, u_id: str | None) -> HAKlyqaAccount | None:
+        """Return the account with a light entity for the bulb."""
+        if not u_id:
+            return None
+        for account in self.accounts():
+            if u_id in account.entities:
+                return account
+        return None
+
+    def account_for_bulb(self, u_id: str | None) -> HAKlyqaAccount | None:
+        """Return the account that has messages for the bulb."""
+        accounts = self.accounts()
+
+        if u_id:
+            for account in accounts:
+                if u_id in account.message_queue:
+                    return account
+        for account in accounts:
+            if account.message_queue and (not u_id or "all" in account.message_queue):
+                return account
+        return None
+
     def init(
         self,
         logger: logging.Logger,
@@ -228,13 +1088,18 @@ class KlyqaDataCoordinator(EntityComponent):
         scan_interval: timedelta = DEFAULT_SCAN_INTERVAL,
     ) -> None:
         """__init"""
-        print("Init new instance")
+        LOGGER.debug("Init new instance")
         super().__init__(logger, domain, hass, scan_interval)
         self.klyqa_accounts = {}
-        self.get_ports()
+        self.udp = None
+        self.tcp = None
+        self._accept_task = None
 
         self.entries = {}
         self.remove_listeners = []
+        self.profiles = KlyqaProductProfiles(hass)
+        self.addresses = KlyqaAddressCache(hass)
+        self.blocking = KlyqaBlockingDetector()
 
     @classmethod
     def instance(
@@ -246,7 +1111,7 @@ class KlyqaDataCoordinator(EntityComponent):
     ) -> KlyqaDataCoordinator:
         """instance"""
         if cls._instance is None:
-            print("Creating new instance")
+            LOGGER.debug("Creating new instance")
             cls._instance = cls.__new__(cls)
             # Put any initialization here.
             cls._instance.init(logger, domain, hass, scan_interval)
@@ -0,0 +1,46 @@
+"""Diagnostics support for Klyqa."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .datacoordinator import HAKlyqaAccount
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return the connection, poll and timing metrics of the account."""
+    data: dict[str, Any] = {"entry": async_redact_data(dict(entry.data), TO_REDACT)}
+    klyqa: HAKlyqaAccount | None = hass.data[DOMAIN].entries.get(entry.entry_id)
+    if not klyqa:
+        return data
+
+    queues = [entity.command_queue for entity in klyqa.entities.values()]
+    data.update(
+        {
+            "lights": len(klyqa.entities),
+            "connection_pool": {
+                "size": len(klyqa.connection_pool),
+                "hits": klyqa.connection_pool.hits,
+                "misses": klyqa.connection_pool.misses,
+            },
+            "command_queue": {
+                "sent": sum(queue.sent for queue in queues),
+                "coalesced": sum(queue.coalesced for queue in queues),
+            },
+            "poller": klyqa.poller.stats() if klyqa.poller else None,
+            "room_sync": klyqa.room_sync.stats() if klyqa.room_sync else None,
+            "timings": klyqa.timings.as_dict(),
+            "blocking": hass.data[DOMAIN].blocking.as_dict(),
+            "log_suppressed": klyqa.bulb_log.suppressed,
+        }
+    )
+    return data
@@ -12,21 +12,20 @@ from homeassistant.helpers import device_registry as dr
 from typing import Any
 from homeassistant.util import dt as slugify
 
-from homeassistant.core import HomeAssistant, Event
+from homeassistant.core import HomeAssistant, Event, callback
 
 from homeassistant.const import Platform
 from homeassistant.helpers.entity_component import EntityComponent
 
-from homeassistant.util.color import (
-    color_temperature_kelvin_to_mired,
-    color_temperature_mired_to_kelvin,
-)
+from homeassistant.util.color import color_temperature_mired_to_kelvin
 import traceback
 from collections.abc import Callable
 import asyncio
+import time
 
-SAVE_DELAY = 0.5
 TIMEOUT_SEND = 11
+POWER_ON_DELAY = 0.2
+"""seconds between the lamp attributes and the power on sent separately"""
 
 from homeassistant.components.group.light import LightGroup
 
@@ -68,15 +67,29 @@ from homeassistant.config_entries import ConfigEntry
 
 from klyqa_ctl import klyqa_ctl as api
 from . import datacoordinator as coord
-from .datacoordinator import HAKlyqaAccount, KlyqaDataCoordinator
+from .command import KlyqaCommand, KlyqaCommandQueue
+from .logs import KlyqaEntityLabel
+from .poller import KlyqaFleetPoller, poll_config
+from .profiles import (
+    DEFAULT_VALUE_RANGES,
+    KlyqaProductProfile,
+    KlyqaProductProfiles,
+    common_value_ranges,
+)
+from .scenes import SCENES_BY_LABEL, KlyqaScene
+from .state import KlyqaLightState
+from .datacoordinator import HAKlyqaAccount, KlyqaDataCoordinator, group_members
 
 from .const import (
+    CONF_POLL_CONCURRENCY,
+    CONF_POLL_MAX_INTERVAL,
+    CONF_POLL_MIN_INTERVAL,
     CONF_POLLING,
     DOMAIN,
     LOGGER,
     CONF_SYNC_ROOMS,
-    EVENT_KLYQA_NEW_LIGHT,
-    EVENT_KLYQA_NEW_LIGHT_GROUP,
+    EVENT_KLYQA_NEW_LIGHTS,
+    EVENT_KLYQA_NEW_LIGHT_GROUPS,
 )
 
 SUPPORT_KLYQA = LightEntityFeature.TRANSITION
@@ -105,7 +118,7 @@ async def async_setup_entry(
         )
         klyqa = hass.data[DOMAIN].entries[entry.entry_id]
 
-        if not klyqa or not await hass.async_add_executor_job(klyqa.login):
+        if not klyqa:
             return
 
     klyqa = hass.data[DOMAIN].entries[entry.entry_id]
@@ -161,11 +174,8 @@ async def create_klyqa_api_from_config(hass, config: ConfigType) -> HAKlyqaAccou
         scan_interval=scan_interval,
     )
     component.klyqa_accounts[username] = klyqa
-    login = await hass.async_add_executor_job(klyqa.login)
     try:
-        if login:
-            await asyncio.wait_for(login, timeout=11)
-        else:
+        if not await asyncio.wait_for(klyqa.login(), timeout=11):
             raise Exception()
     except:  # noqa: E722 pylint: disable=bare-except
 
@@ -176,26 +186,154 @@ async def create_klyqa_api_from_config(hass, config: ConfigType) -> HAKlyqaAccou
     return klyqa
 
 
+def command_from_kwargs(kwargs: dict[str, Any]) -> KlyqaCommand:
+    """Return the command for the lamp attributes of the turn on arguments."""
+    command = KlyqaCommand()
+
+    if ATTR_HS_COLOR in kwargs:
+        command.color(*color_util.color_hs_to_RGB(*kwargs[ATTR_HS_COLOR]))
+
+    if ATTR_RGB_COLOR in kwargs:
+        command.color(*kwargs[ATTR_RGB_COLOR])
+
+    if ATTR_RGBWW_COLOR in kwargs:
+        command.percent_color(*kwargs[ATTR_RGBWW_COLOR])
+
+    if ATTR_COLOR_TEMP in kwargs:
+        command.temperature(
+            color_temperature_mired_to_kelvin(kwargs[ATTR_COLOR_TEMP])
+            if kwargs[ATTR_COLOR_TEMP]
+            else 0
+        )
+
+    if ATTR_BRIGHTNESS in kwargs:
+        command.brightness(round((int(kwargs[ATTR_BRIGHTNESS]) / 255.0) * 100.0))
+
+    if ATTR_BRIGHTNESS_PCT in kwargs:
+        command.brightness(kwargs[ATTR_BRIGHTNESS_PCT])
+
+    return command
+
+
+async def async_send_then_power_on(
+    send: Callable[[KlyqaCommand], Coroutine[Any, Any, None]],
+    command: KlyqaCommand,
+    transition_time: int | None,
+) -> None:
+    """Send the lamp attributes and the power on as separate commands."""
+    if command:
+        if transition_time:
+            command.transition(transition_time)
+        await send(command)
+        await asyncio.sleep(POWER_ON_DELAY)
+
+    power = KlyqaCommand().power(True)
+    if transition_time:
+        power.transition(transition_time)
+    await send(power)
+
+
 class KlyqaLightGroup(LightGroup):
-    """Lightgroup."""
+    """Lightgroup.
 
-    def __init__(self, hass: HomeAssistant, settings: dict[Any, Any]) -> None:
+    Switches all member bulbs with one multi unit command instead of
+    forwarding the service call to every member light entity.
+    """
+
+    _attr_transition_time = 500
+
+    def __init__(
+        self, hass: HomeAssistant, settings: dict[Any, Any], klyqa: HAKlyqaAccount
+    ) -> None:
         """Lightgroup."""
         self.hass = hass
         self.settings = settings
+        self._klyqa_api = klyqa
 
-        u_id = api.format_uid(settings["id"])
+        self.u_id = api.format_uid(settings["id"])
 
-        entity_id = ENTITY_ID_FORMAT.format(u_id)
+        entity_id = ENTITY_ID_FORMAT.format(self.u_id)
 
-        entity_ids: list[str] = []
+        self.u_ids: list[str] = group_members(settings)
+        entity_ids: list[str] = [ENTITY_ID_FORMAT.format(uid) for uid in self.u_ids]
 
-        for device in settings["devices"]:
-            uid = api.format_uid(device["localDeviceId"])
+        super().__init__(entity_id, settings["name"], entity_ids, mode=None)
 
-            entity_ids.append(ENTITY_ID_FORMAT.format(uid))
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        """Turn on all member bulbs with one command."""
+        if ATTR_EFFECT in kwargs or not self.u_ids:
+            # scene routines are stored per bulb
+            await super().async_turn_on(**kwargs)
+            return
 
-        super().__init__(entity_id, settings["name"], entity_ids, mode=None)
+        if ATTR_TRANSITION in kwargs:
+            self._attr_transition_time = kwargs[ATTR_TRANSITION]
+
+        command = command_from_kwargs(kwargs)
+        if self._attr_transition_time:
+            command.transition(self._attr_transition_time)
+
+        members = [self._klyqa_api.entities.get(uid) for uid in self.u_ids]
+        if command and all(
+            member and member.supports_combined_frame(command) for member in members
+        ):
+            await self.async_send(command.power(True), combined=True)
+            return
+
+        await async_send_then_power_on(
+            self.async_send, command, self._attr_transition_time
+        )
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        """Turn off all member bulbs with one command."""
+        if not self.u_ids:
+            await super().async_turn_off(**kwargs)
+            return
+
+        command = KlyqaCommand().power(False)
+        if self._attr_transition_time:
+            command.transition(self._attr_transition_time)
+        await self.async_send(command)
+
+    async def async_added_to_hass(self) -> None:
+        """Register the group entity at the account."""
+        await super().async_added_to_hass()
+        self._klyqa_api.group_entities[self.u_id] = self
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Unregister the group entity."""
+        if self._klyqa_api.group_entities.get(self.u_id) is self:
+            self._klyqa_api.group_entities.pop(self.u_id)
+        await super().async_will_remove_from_hass()
+
+    async def async_send(self, command: KlyqaCommand, combined: bool = False) -> None:
+        """Send the command to all member bulbs at once.
+
+        The answers are applied to the member light entities as they arrive.
+        """
+        LOGGER.debug("Send to bulb group %s: %s", self.entity_id, command)
+        if combined:
+            members = [self._klyqa_api.entities.get(uid) for uid in self.u_ids]
+            command.clamp(
+                common_value_ranges(
+                    [member.profile if member else None for member in members]
+                )
+            )
+        if combined and (msg := command.frame_msg()):
+            await self._klyqa_api.send_frame_to_bulbs(
+                msg,
+                self.u_ids,
+                command.args,
+                async_answer_callback=self._klyqa_api.async_apply_answer,
+                timeout_ms=TIMEOUT_SEND * 1000,
+            )
+        else:
+            await self._klyqa_api.send_to_bulbs(
+                command.args_parsed(self.u_ids),
+                command.args_in(self.u_ids),
+                async_answer_callback=self._klyqa_api.async_apply_answer,
+                timeout_ms=TIMEOUT_SEND * 1000,
+            )
 
 
 async def async_setup_klyqa(
@@ -207,6 +345,7 @@ async def async_setup_klyqa(
     entry: ConfigEntry | None = None,
 ) -> None:
     """Set up the Klyqa Light platform."""
+    setup_started = time.monotonic()
 
     klyqa.search_and_send_loop_task = hass.loop.create_task(
         klyqa.search_and_send_to_bulb()
@@ -222,64 +361,108 @@ async def async_setup_klyqa(
     if entry:
         entry.async_on_unload(listener)
 
-    entity_registry = er.async_get(hass)
-
-    async def add_new_light_group(event: Event) -> None:
-
-        device_settings = event.data
-
-        try:
-            entity = KlyqaLightGroup(hass, device_settings)
-        except Exception as e:
-            LOGGER.warn(f"Couldn't add light group {device_settings['name']}")
+    async def add_new_light_groups(event: Event) -> None:
+        """Add the light groups of the new device groups in one go."""
+        if event.data.get(CONF_USERNAME) != klyqa.username:
             return
 
-        add_entities([entity], True)
-
-    async def add_new_entity(event: Event) -> None:
+        entities = []
+        for device_settings in event.data["groups"]:
+            try:
+                entities.append(KlyqaLightGroup(hass, device_settings, klyqa))
+            except Exception:  # pylint: disable=bare-except,broad-except
+                LOGGER.warning("Couldn't add light group %s", device_settings["name"])
 
-        device_settings = event.data
+        add_entities(entities)
 
-        u_id = api.format_uid(device_settings["localDeviceId"])
+    async def add_new_entities(event: Event) -> None:
+        """Add the lights of the new devices in one go."""
+        if event.data.get(CONF_USERNAME) != klyqa.username:
+            return
 
-        entity_id = ENTITY_ID_FORMAT.format(u_id)
+        entities: list[KlyqaLight] = []
+        for device_settings in event.data["devices"]:
+            u_id = api.format_uid(device_settings["localDeviceId"])
+            entity_id = ENTITY_ID_FORMAT.format(u_id)
+
+            LOGGER.debug("Add entity %s (%s).", entity_id, device_settings.get("name"))
+            entity = KlyqaLight(
+                device_settings,
+                klyqa,
+                entity_id,
+                should_poll=False,
+                config_entry=entry,
+                hass=hass,
+            )
+            entities.append(entity)
 
-        light_state = klyqa.bulbs[u_id] if u_id in klyqa.bulbs else api.KlyqaBulb()
+        results = await asyncio.gather(
+            *(entity.async_update_settings() for entity in entities),
+            return_exceptions=True,
+        )
+        loaded: list[KlyqaLight] = []
+        failed: list[str] = []
+        for entity, result in zip(entities, results):
+            if isinstance(result, Exception):
+                LOGGER.error("Could not apply the device settings: %s", result)
+                failed.append(entity.u_id)
+                continue
+            bulb = klyqa.bulbs.get(entity.u_id)
+            entity._update_state(bulb.status if bulb else None)
+            loaded.append(entity)
+        # added with the next settings update that loads their settings
+        klyqa.forget_processed_devices(failed)
+        if not loaded:
+            return
+        # states are requested for all new bulbs at once below instead of
+        # updating each entity before adding it
+        add_entities(loaded)
+        hass.async_create_task(async_initial_states([entity.u_id for entity in loaded]))
+
+    async def async_initial_states(u_ids: list[str]) -> None:
+        """Request the states of the new lights, count the setup time."""
+        if klyqa.poller is not None:
+            await klyqa.poller.async_poll(u_ids)
+        else:
+            await klyqa.async_request_states(u_ids)
+        seconds = time.monotonic() - setup_started
+        klyqa.timings.record("setup", seconds, always=True)
+        LOGGER.debug(
+            "States of %s new lights applied %.3f s after the platform setup"
+            " started.",
+            len(u_ids),
+            seconds,
+        )
 
-        entity = entity_registry.async_get(entity_id)
-        # if (
-        #     # not u_id == "2e383c6ab161610d83f1"
-        #     # and not u_id == slugify("286DCD7933E3") and
-        #     not u_id
-        #     == slugify("60865279cb2a7d7a3684")
-        # ):
+    def on_unload(listener: Callable[[], None]) -> None:
+        """Remove the listener with the entry, yaml accounts with the domain."""
+        if entry:
+            entry.async_on_unload(listener)
+        else:
+            hass.data[DOMAIN].remove_listeners.append(listener)
 
-        #     return
+    on_unload(hass.bus.async_listen(EVENT_KLYQA_NEW_LIGHTS, add_new_entities))
+    on_unload(hass.bus.async_listen(EVENT_KLYQA_NEW_LIGHT_GROUPS, add_new_light_groups))
 
-        LOGGER.info(f"Add entity {entity_id} ({device_settings.get('name')}).")
-        entity = KlyqaLight(
-            device_settings,
-            light_state,
+    if klyqa.polling:
+        settings = poll_config(config)
+        poller = KlyqaFleetPoller(
+            hass,
             klyqa,
-            entity_id,
-            should_poll=klyqa.polling,
-            config_entry=entry,
-            hass=hass,
+            klyqa.get_scan_interval(),
+            settings[CONF_POLL_CONCURRENCY],
+            settings[CONF_POLL_MIN_INTERVAL],
+            settings[CONF_POLL_MAX_INTERVAL],
         )
-        await entity.async_update_settings()
-        entity._update_state(light_state.status)
-        if entity:
-            add_entities([entity], True)
+        on_unload(poller.async_start())
 
-    hass.data[DOMAIN].remove_listeners.append(
-        hass.bus.async_listen(EVENT_KLYQA_NEW_LIGHT, add_new_entity)
-    )
-
-    hass.data[DOMAIN].remove_listeners.append(
-        hass.bus.async_listen(EVENT_KLYQA_NEW_LIGHT_GROUP, add_new_light_group)
-    )
+    if klyqa.room_sync is not None:
+        on_unload(klyqa.room_sync.async_cancel)
 
-    await klyqa.update_account()
+    # keeps the settings refreshing, process_account_settings applies the
+    # changes to the entities
+    on_unload(klyqa.settings_coordinator.async_add_listener(lambda: None))
+    await klyqa.settings_coordinator.async_refresh()
     return
 
 
@@ -289,8 +472,14 @@ class KlyqaLight(LightEntity):
     _attr_supported_features = SUPPORT_KLYQA
     _attr_transition_time = 500
 
+    _attr_supported_color_modes = frozenset({ColorMode.BRIGHTNESS})
+    _attr_effect_list: tuple[str, ...] = ()
+
     _klyqa_api: HAKlyqaAccount
-    _klyqa_device: api.KlyqaBulb
+    _state: KlyqaLightState
+    """light state taken from the bulb status"""
+    _profile: KlyqaProductProfile | None = None
+    """product profile shared by the lights of the product"""
     settings: dict[Any, Any] = {}
     """synchronise rooms to HA"""
     sync_rooms: bool = False
@@ -299,13 +488,11 @@ class KlyqaLight(LightEntity):
     """entity added finished"""
     _added_klyqa: bool = False
     u_id: str
-    send_event_cb: asyncio.Event | None = None
     hass: HomeAssistant
 
     def __init__(
         self,
         settings: Any,
-        device: api.KlyqaBulb,
         klyqa_api: Any,
         entity_id: Any,
         hass: HomeAssistant,
@@ -320,73 +507,41 @@ class KlyqaLight(LightEntity):
         self.sync_rooms = klyqa_api.sync_rooms
         self.u_id = api.format_uid(settings["localDeviceId"])
         self._attr_unique_id: str = api.format_uid(self.u_id)
-        self._klyqa_device = device
+        self._state = KlyqaLightState()
         self.entity_id = entity_id
 
         self._attr_should_poll = should_poll
         self._attr_device_class = "light"
         self._attr_icon = "mdi:lightbulb"
-        self._attr_supported_color_modes: set[ColorMode] = set()
-        self._attr_supported_color_modes = {ColorMode.BRIGHTNESS}
-        self._attr_effect_list = []
         self.config_entry = config_entry
-        self.send_event_cb: asyncio.Event = asyncio.Event()
 
-        self.device_config: api.Bulb_config = {}
+        self.command_queue = KlyqaCommandQueue(
+            lambda command: self.send_to_bulbs(command, combined=True)
+        )
         self.settings = {}
-        self.rooms: list[Any] = []
+        self._log_label = KlyqaEntityLabel(self)
         pass
 
     async def set_device_capabilities(self) -> None:
         """Look up profile."""
-        if self.settings["productId"] in api.bulb_configs:
-            self.device_config = api.bulb_configs[self.settings["productId"]]
-        else:
-            try:
-                response_object = await self.hassasync_add_executor_job(
-                    partial(
-                        self._klyqa_api.request,
-                        "/config/product/" + self.settings["productId"],
-                        timeout=30,
-                    )
-                )
-                self.device_config = json.loads(response_object.text)
-            except:  # noqa: E722 pylint: disable=bare-except
-                LOGGER.error("Could not load device configuration profile")
-                return
+        profiles: KlyqaProductProfiles = self.hass.data[DOMAIN].profiles
+        profile = await profiles.async_get(self.settings["productId"], self._klyqa_api)
+        if not profile:
+            LOGGER.error("Could not load device configuration profile")
+            return
 
-        if (
-            self.device_config
-            and "deviceTraits" in self.device_config
-            and (device_traits := self.device_config["deviceTraits"])
-        ):
-            if [
-                x
-                for x in device_traits
-                if "msg_key" in x and x["msg_key"] == "temperature"
-            ]:
-                self._attr_supported_color_modes.add(ColorMode.COLOR_TEMP)
-
-            if [x for x in device_traits if "msg_key" in x and x["msg_key"] == "color"]:
-                self._attr_supported_color_modes.add(ColorMode.RGB)
-                self._attr_supported_features |= LightEntityFeature.EFFECT  # type: ignore[assignment]
-                self._attr_effect_list = [x["label"] for x in api.SCENES]
-            else:
-                self._attr_effect_list = [x["label"] for x in api.SCENES if "cwww" in x]
+        self._profile = profile
+        self._attr_supported_color_modes = profile.color_modes
+        self._attr_supported_features = SUPPORT_KLYQA | profile.supported_features
+        self._attr_effect_list = profile.effect_list
 
     async def async_update_settings(self) -> None:
         """Set device specific settings from the klyqa settings cloud."""
-        devices_settings = self._klyqa_api.acc_settings["devices"]
-
-        device_result = [
-            x
-            for x in devices_settings
-            if api.format_uid(str(x["localDeviceId"])) == self.u_id
-        ]
-        if len(device_result) < 1:
+        device_settings = self._klyqa_api.device_index.get(self.u_id)
+        if not device_settings:
             return
 
-        self.settings = device_result[0]
+        self.settings = device_settings
         await self.set_device_capabilities()
 
         self._attr_name = self.settings["name"]
@@ -400,13 +555,9 @@ class KlyqaLight(LightEntity):
             hw_version=self.settings["hardwareRevision"],
         )
 
-        if (
-            self.device_config
-            and "productId" in self.device_config
-            and self.device_config["productId"] in api.PRODUCT_URLS
-        ):
+        if self._profile and self._profile.product_id in api.PRODUCT_URLS:
             self._attr_device_info["configuration_url"] = api.PRODUCT_URLS[
-                self.device_config["productId"]
+                self._profile.product_id
             ]
 
         entity_registry = er.async_get(self.hass)
@@ -419,10 +570,6 @@ class KlyqaLight(LightEntity):
 
         device_registry = dr.async_get(self.hass)
 
-        device = device_registry.async_get_device(
-            identifiers={(DOMAIN, self._attr_unique_id)}
-        )
-
         if self.config_entry:
 
             device_registry.async_get_or_create(
@@ -436,52 +583,15 @@ class KlyqaLight(LightEntity):
             self._attr_device_info["suggested_area"] = entity_registry_entry.area_id
 
         if self.sync_rooms:
-            self.rooms = []
-            for room in self._klyqa_api.acc_settings["rooms"]:
-                for device in room["devices"]:
-                    if device and api.format_uid(device["localDeviceId"]) == self.u_id:  # type: ignore[index]
-                        self.rooms.append(room)
-
-            if (
-                entity_registry_entry
-                and entity_registry_entry.area_id
-                and len(self.rooms) == 0
-            ):
-                entity_registry.async_update_entity(
-                    entity_id=entity_registry_entry.entity_id, area_id=""
-                )
+            # the areas themselves are assigned by the room sync of the account
+            rooms = self._klyqa_api.room_index.get(self.u_id)
+            if rooms:
+                self._attr_device_info["suggested_area"] = rooms[0]["name"]
 
-            if len(self.rooms) > 0:
-                area_reg = ar.async_get(self.hass)
-                # only 1 room supported per device by ha
-                area: AreaEntry | None = area_reg.async_get_area_by_name(
-                    self.rooms[0]["name"]
-                )
-                if not area:
-                    area = area_reg.async_get_or_create(self.rooms[0]["name"])
-                    # try directly save the new area.
-                    # pylint: disable=protected-access
-                    await area_reg._store.async_save(area_reg._data_to_save())
-                    if not area_reg.async_get_area_by_name(self.rooms[0]["name"]):
-                        await asyncio.sleep(SAVE_DELAY)
-                        area = area_reg.async_get_or_create(self.rooms[0]["name"])
-
-                if area:
-                    self._attr_device_info["suggested_area"] = area.name
-                    LOGGER.info("Add bulb %s to room %s", self.name, area.name)
-
-                    if (
-                        entity_registry_entry
-                        and entity_registry_entry.area_id != area.id
-                    ):
-                        entity_registry.async_update_entity(
-                            entity_id=entity_registry_entry.entity_id, area_id=area.id
-                        )
-                        # try directly save the changed entity area.
-                        # pylint: disable=protected-access
-                        await entity_registry._store.async_save(
-                            entity_registry._data_to_save()
-                        )
+    @property
+    def profile(self) -> KlyqaProductProfile | None:
+        """Return the product profile of the bulb."""
+        return self._profile
 
     @property
     def entity_registry_enabled_default(self) -> bool:
@@ -490,186 +600,156 @@ class KlyqaLight(LightEntity):
 
     async def async_turn_on(self, **kwargs):
         """Instruct the light to turn off."""
-        args = []
+        command = KlyqaCommand()
+        state = self._state
+        # the answer is taken even if the bulb state did not change
+        state.invalidate()
 
         if ATTR_HS_COLOR in kwargs:
             rgb = color_util.color_hs_to_RGB(*kwargs[ATTR_HS_COLOR])
-            self._attr_rgb_color = (rgb[0], rgb[1], rgb[2])
-            self._attr_hs_color = kwargs[ATTR_HS_COLOR]
+            state.rgb_color = (rgb[0], rgb[1], rgb[2])
+            state.hs_color = kwargs[ATTR_HS_COLOR]
 
         if ATTR_RGB_COLOR in kwargs:
-            self._attr_rgb_color = kwargs[ATTR_RGB_COLOR]
+            state.rgb_color = kwargs[ATTR_RGB_COLOR]
 
-        if self._attr_rgb_color and ATTR_RGB_COLOR in kwargs or ATTR_HS_COLOR in kwargs:
-            args.extend(
-                ["--color", *([str(rgb) for rgb in self._attr_rgb_color])]  # type: ignore[union-attr]
-            )
+        if state.rgb_color and ATTR_RGB_COLOR in kwargs or ATTR_HS_COLOR in kwargs:
+            command.color(*state.rgb_color)  # type: ignore[misc]
 
         if ATTR_RGBWW_COLOR in kwargs:
             self._attr_rgbww_color = kwargs[ATTR_RGBWW_COLOR]
-            args.extend(
-                [
-                    "--percent_color",
-                    *([str(rgb) for rgb in self._attr_rgbww_color]),  # type: ignore[union-attr]
-                ]
-            )
+            command.percent_color(*self._attr_rgbww_color)  # type: ignore[misc]
 
         if ATTR_EFFECT in kwargs:
-            scene_result = [x for x in api.SCENES if x["label"] == kwargs[ATTR_EFFECT]]
-            if len(scene_result) > 0:
-                scene = scene_result[0]
-                self._attr_effect = kwargs[ATTR_EFFECT]
-                commands = scene["commands"]
-                if len(commands.split(";")) > 2:
-                    commands += "l 0;"
-
-                send_event_cb: asyncio.Event = asyncio.Event()
-
-                async def callback(msg: api.Message, uid: str) -> None:
-                    nonlocal args, self
-                    # if (
-                    #     msg.state == api.Message_state.sent
-                    #     or msg.state == api.Message_state.answered
-                    # ):
-                    if msg.state in (
-                        api.Message_state.sent,
-                        api.Message_state.answered,
-                    ):
-                        send_event_cb.set()
-                        args.extend(
-                            [
-                                "--routine_id",
-                                "0",
-                                "--routine_start",
-                            ]
-                        )
-
-                await self.send_to_bulbs(
-                    [
-                        "--routine_id",
-                        "0",
-                        "--routine_scene",
-                        str(scene["id"]),
-                        "--routine_put",
-                        "--routine_command",
-                        commands,
-                    ],
-                    callback,
-                )
+            scene = SCENES_BY_LABEL.get(kwargs[ATTR_EFFECT])
+            if scene:
+                state.effect = scene.label
 
-                await send_event_cb.wait()
+                if self._klyqa_api.routine_scenes.get(self.u_id) == str(scene.id):
+                    # the scene is still stored as routine on the bulb
+                    command.routine_start(0)
+                elif await self.async_put_scene_routine(scene):
+                    command.routine_start(0)
 
         if ATTR_COLOR_TEMP in kwargs:
-            self._attr_color_temp = kwargs[ATTR_COLOR_TEMP]
-            args.extend(
-                [
-                    "--temperature",
-                    str(
-                        color_temperature_mired_to_kelvin(self._attr_color_temp)
-                        if self._attr_color_temp
-                        else 0
-                    ),
-                ]
+            state.color_temp = kwargs[ATTR_COLOR_TEMP]
+            command.temperature(
+                color_temperature_mired_to_kelvin(state.color_temp)
+                if state.color_temp
+                else 0
             )
 
         if ATTR_BRIGHTNESS in kwargs:
-            self._attr_brightness = int(kwargs[ATTR_BRIGHTNESS])
-
-            args.extend(
-                ["--brightness", str(round((self._attr_brightness / 255.0) * 100.0))]
-            )
+            state.brightness = int(kwargs[ATTR_BRIGHTNESS])
+            command.brightness(round((state.brightness / 255.0) * 100.0))
 
         if ATTR_BRIGHTNESS_PCT in kwargs:
-            self._attr_brightness = int(
-                round((kwargs[ATTR_BRIGHTNESS_PCT] / 100) * 255)
-            )
-            args.extend(["--brightness", str(ATTR_BRIGHTNESS_PCT)])
-
-        # separate power on+transition and other lamp attributes
+            state.brightness = int(round((kwargs[ATTR_BRIGHTNESS_PCT] / 100) * 255))
+            command.brightness(kwargs[ATTR_BRIGHTNESS_PCT])
 
-        if len(args) > 0:
+        if ATTR_TRANSITION in kwargs:
+            self._attr_transition_time = kwargs[ATTR_TRANSITION]
 
-            if ATTR_TRANSITION in kwargs:
-                self._attr_transition_time = kwargs[ATTR_TRANSITION]
+        if self.supports_combined_frame(command):
+            # lamp attributes and power on in one frame
+            command.power(True)
 
             if self._attr_transition_time:
-                args.extend(["--transitionTime", str(self._attr_transition_time)])
+                command.transition(self._attr_transition_time)
 
-            LOGGER.info(
-                "Send to bulb %s%s: %s",
-                str(self.entity_id),
-                " (" + self.name + ")" if self.name else "",
-                " ".join(args),
+            self._klyqa_api.bulb_log.debug(
+                self.u_id, "send", "Send to bulb %s: %s", self._log_label, command
             )
 
-            await self.send_to_bulbs(args)
-            await asyncio.sleep(0.2)
+            await self.command_queue.async_send(command)
+            return
 
-        args = ["--power", "on"]
+        # separate power on+transition and other lamp attributes
+        await async_send_then_power_on(
+            self._async_send_logged, command, self._attr_transition_time
+        )
 
-        if ATTR_TRANSITION in kwargs:
-            self._attr_transition_time = kwargs[ATTR_TRANSITION]
+    async def _async_send_logged(self, command: KlyqaCommand) -> None:
+        self._klyqa_api.bulb_log.debug(
+            self.u_id, "send", "Send to bulb %s: %s", self._log_label, command
+        )
+        await self.send_to_bulbs(command)
 
-        if self._attr_transition_time:
-            args.extend(["--transitionTime", str(self._attr_transition_time)])
+    async def async_put_scene_routine(self, scene: KlyqaScene) -> bool:
+        """Store the scene as routine 0 on the bulb."""
+        stored = False
 
-        LOGGER.info(
-            "Send to bulb %s%s: %s",
-            self.entity_id,
-            f" ({self.name})" if self.name else "",
-            " ".join(args),
-        )
+        async def callback(msg: api.Message, uid: str) -> None:
+            nonlocal stored
+            if msg and msg.state in (
+                api.Message_state.sent,
+                api.Message_state.answered,
+            ):
+                stored = True
 
-        await self.send_to_bulbs(args)
+        await self.send_to_bulbs(
+            KlyqaCommand().routine_put(0, scene.id, scene.routine_commands),
+            callback,
+        )
+        if stored:
+            self._klyqa_api.routine_scenes[self.u_id] = str(scene.id)
+        return stored
+
+    def supports_combined_frame(self, command: KlyqaCommand) -> bool:
+        """Return true if the bulb takes the command and power on in one frame.
+
+        Bulbs without a product profile or whose profile misses the traits of
+        the command attributes get the attributes and power on separately.
+        """
+        return (
+            bool(command)
+            and self._profile is not None
+            and bool(self._profile.msg_keys)
+            and command.frame() is not None
+            and command.msg_keys() <= self._profile.msg_keys
+        )
 
     async def async_turn_off(self, **kwargs):
         """Instruct the light to turn off."""
 
-        args = ["--power", "off"]
+        command = KlyqaCommand().power(False)
+        self._state.invalidate()
 
         if self._attr_transition_time:
-            args.extend(["--transitionTime", str(self._attr_transition_time)])
+            command.transition(self._attr_transition_time)
 
-        LOGGER.info(
-            f"Send to bulb {self.entity_id}%s: %s",
-            f" ({self.name})" if self.name else "",
-            " ".join(args),
+        self._klyqa_api.bulb_log.debug(
+            self.u_id, "send", "Send to bulb %s: %s", self._log_label, command
         )
-        await self.send_to_bulbs(args)
-
-    async def async_update_klyqa(self) -> None:
-        """Fetch settings from klyqa cloud account."""
-
-        await self._klyqa_api.request_account_settings_eco()
-        if self._added_klyqa:
-            await self._klyqa_api.process_account_settings()
-        await self.async_update_settings()
+        if self.supports_combined_frame(command):
+            await self.command_queue.async_send(command)
+        else:
+            await self.send_to_bulbs(command)
 
     async def async_update(self) -> None:
         """Fetch new state data for this light. Called by HA."""
 
-        name = f" ({self.name})" if self.name else ""
-        LOGGER.info("Update bulb %s%s", self.entity_id, name)
-
-        try:
-            await self.async_update_klyqa()
-
-        except (Exception,) as exception:  # pylint: disable=bare-except,broad-except
-            LOGGER.error(str(exception))
-            LOGGER.error("%s", traceback.format_exc())
-            LOGGER.exception(exception)
+        self._klyqa_api.bulb_log.debug(
+            self.u_id, "update", "Update bulb %s", self._log_label
+        )
 
-        await self.send_to_bulbs(["--request"])
+        await self.send_to_bulbs(KlyqaCommand().request())
 
         self._update_state(self._klyqa_api.bulbs[self.u_id].status)
 
     async def send_to_bulbs(
         self,
-        args: list[Any],
+        command: KlyqaCommand,
         callback: Callable[[Any, str], Coroutine[Any, Any, None]] | None = None,
+        combined: bool = False,
     ) -> None:
-        """Send_to_bulbs."""
+        """Send_to_bulbs.
+
+        With combined the command is delivered as one request frame.
+        """
 
+        timings = self._klyqa_api.timings
+        command_started = timings.start()
         send_event_cb: asyncio.Event = asyncio.Event()
 
         async def send_answer_cb(msg: api.Message, uid: str) -> None:
@@ -677,40 +757,63 @@ class KlyqaLight(LightEntity):
             if callback is not None:
                 await callback(msg, uid)
             try:
-                LOGGER.debug("Send_answer_cb %s", str(uid))
+                self._klyqa_api.bulb_log.debug(uid, "answer", "Send_answer_cb %s", uid)
                 # ttl ended
                 if uid != self.u_id:
                     return
-                self._update_state(self._klyqa_api.bulbs[self.u_id].status)
-                if self._added_klyqa:
+                if (
+                    not msg
+                    or msg.state == api.Message_state.unsent
+                    or msg.answer_json.get("type") == "error"
+                ):
+                    # the bulb may have lost its stored routine
+                    self._klyqa_api.routine_scenes.pop(self.u_id, None)
+                apply_started = timings.start()
+                changed = self._update_state(self._klyqa_api.bulbs[self.u_id].status)
+                if changed and self._added_klyqa:
                     self.schedule_update_ha_state()
                 # await self.async_schedule_update_ha_state(force_refresh=True)
+                timings.stop("apply", apply_started, self.u_id)
+                timings.stop("command", command_started, self.u_id)
             except:  # noqa: E722 pylint: disable=bare-except
                 LOGGER.error(traceback.format_exc())
             finally:
                 send_event_cb.set()
 
-        parser = api.get_description_parser()
-        args.extend(["--local", "--bulb_unitids", f"{self.u_id}"])
-
-        api.add_config_args(parser=parser)
-        api.add_command_args(parser=parser)
-
-        args_parsed = parser.parse_args(args=args)
+        if self._klyqa_api.poller is not None:
+            self._klyqa_api.poller.note_activity(self.u_id)
 
-        LOGGER.info("Send start!")
-        new_task = asyncio.create_task(
-            self._klyqa_api.send_to_bulbs(
-                args_parsed,
-                args,
-                async_answer_callback=send_answer_cb,
-                timeout_ms=TIMEOUT_SEND * 1000,
+        build_started = timings.start()
+        if combined:
+            command.clamp(
+                self._profile.value_ranges if self._profile else DEFAULT_VALUE_RANGES
+            )
+        if combined and (msg := command.frame_msg()):
+            args = command.args
+            timings.stop("build", build_started, self.u_id)
+            new_task = asyncio.create_task(
+                self._klyqa_api.send_frame_to_bulbs(
+                    msg,
+                    [self.u_id],
+                    args,
+                    async_answer_callback=send_answer_cb,
+                    timeout_ms=TIMEOUT_SEND * 1000,
+                )
+            )
+        else:
+            args_parsed = command.args_parsed([self.u_id])
+            args_in = command.args_in([self.u_id])
+            timings.stop("build", build_started, self.u_id)
+            new_task = asyncio.create_task(
+                self._klyqa_api.send_to_bulbs(
+                    args_parsed,
+                    args_in,
+                    async_answer_callback=send_answer_cb,
+                    timeout_ms=TIMEOUT_SEND * 1000,
+                )
             )
-        )
-        LOGGER.info("Send started!")
         await send_event_cb.wait()
 
-        LOGGER.info("Send started wait ended!")
         try:
             await asyncio.wait([new_task], timeout=0.001)
         except asyncio.TimeoutError:
@@ -721,14 +824,36 @@ class KlyqaLight(LightEntity):
         """Added to hass."""
         await super().async_added_to_hass()
         self._added_klyqa = True
+        self._klyqa_api.entities[self.u_id] = self
+        if self._klyqa_api.room_sync is not None:
+            self._klyqa_api.room_sync.async_schedule()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Will be removed from hass."""
+        if self._klyqa_api.entities.get(self.u_id) is self:
+            self._klyqa_api.entities.pop(self.u_id)
+            self._klyqa_api.bulb_log.forget(self.u_id)
+        await super().async_will_remove_from_hass()
+
+    @callback
+    def async_schedule_settings_update(self) -> None:
+        """Apply the changed account settings of the bulb."""
+        self.hass.async_create_task(self._async_update_from_settings())
+
+    async def _async_update_from_settings(self) -> None:
         try:
             await self.async_update_settings()
         except Exception:  # pylint: disable=bare-except,broad-except
             LOGGER.error(traceback.format_exc())
+        self.async_write_ha_state()
 
-    def _update_state(self, state_complete: api.KlyqaBulbResponseStatus) -> None:
-        """Process state request response from the bulb to the entity state."""
+    def _update_state(self, state_complete: api.KlyqaBulbResponseStatus) -> bool:
+        """Process state request response from the bulb to the entity state.
+
+        Return True if the entity state changed.
+        """
         # self._attr_state = STATE_OK if state_complete else STATE_UNAVAILABLE
+        assumed_state = self._attr_assumed_state
         self._attr_assumed_state = True
         # if not self._attr_state:
         #     LOGGER.info(
@@ -739,52 +864,59 @@ class KlyqaLight(LightEntity):
         if not state_complete or not isinstance(
             state_complete, api.KlyqaBulbResponseStatus
         ):
-            return
+            return not assumed_state
 
-        LOGGER.debug(
-            "Update bulb state %s%s",
-            str(self.entity_id),
-            " (" + self.name + ")" if self.name else "",
+        self._klyqa_api.bulb_log.debug(
+            self.u_id, "state", "Update bulb state %s", self._log_label
         )
 
         if state_complete.type == "error":
             LOGGER.error(state_complete.type)
-            return
+            return not assumed_state
 
         state_type = state_complete.type
         if not state_type or state_type != "status":
-            return
+            return not assumed_state
 
-        self._klyqa_device.status = state_complete
+        changed = self._state.update(state_complete)
+        if state_complete.mode == "cmd" and self._klyqa_api.routine_scenes.get(
+            self.u_id
+        ) not in (None, str(state_complete.active_scene)):
+            self._klyqa_api.routine_scenes.pop(self.u_id, None)
+        self._attr_assumed_state = False
+        return changed or assumed_state
 
-        self._attr_color_temp = (
-            color_temperature_kelvin_to_mired(float(state_complete.temperature))
-            if state_complete.temperature
-            else 0
-        )
-        if isinstance(state_complete.color, api.RGBColor):
-            self._attr_rgb_color = (
-                int(state_complete.color.r),
-                int(state_complete.color.g),
-                int(state_complete.color.b),
-            )
-            self._attr_hs_color = color_util.color_RGB_to_hs(*self._attr_rgb_color)
+    @property
+    def is_on(self) -> bool | None:
+        """Return true if the light is on."""
+        return self._state.is_on
 
-        self._attr_brightness = int((float(state_complete.brightness) / 100) * 255)
-        self._attr_is_on = state_complete.status == "on"
+    @property
+    def brightness(self) -> int | None:
+        """Return the brightness of the light."""
+        return self._state.brightness
 
-        self._attr_color_mode = (
-            ColorMode.COLOR_TEMP
-            if state_complete.mode == "cct"
-            else "effect"
-            if state_complete.mode == "cmd"
-            else state_complete.mode
-        )
-        self._attr_effect = ""
-        if state_complete.mode == "cmd":
-            scene_result = [
-                x for x in api.SCENES if str(x["id"]) == state_complete.active_scene
-            ]
-            if len(scene_result) > 0:
-                self._attr_effect = scene_result[0]["label"]
-        self._attr_assumed_state = False
+    @property
+    def color_temp(self) -> int | None:
+        """Return the color temperature in mired."""
+        return self._state.color_temp
+
+    @property
+    def rgb_color(self) -> tuple[int, int, int] | None:
+        """Return the rgb color value."""
+        return self._state.rgb_color
+
+    @property
+    def hs_color(self) -> tuple[float, float] | None:
+        """Return the hue and saturation color value."""
+        return self._state.hs_color
+
+    @property
+    def color_mode(self) -> Any:
+        """Return the color mode of the light."""
+        return self._state.color_mode
+
+    @property
+    def effect(self) -> str | None:
+        """Return the current effect."""
+        return self._state.effect
@@ -0,0 +1,82 @@
+"""Klyqa logging helpers."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+from .const import LOGGER
+
+LOG_RATE_BURST = 5
+"""repetitive messages of a kind logged per bulb and interval"""
+LOG_RATE_INTERVAL = 60.0
+"""seconds after which the repetitive messages of a bulb are logged again"""
+
+
+class KlyqaEntityLabel:
+    """Entity id and name of a light, formatted only when a message is logged."""
+
+    __slots__ = ("_entity",)
+
+    def __init__(self, entity: Any) -> None:
+        """Initialize the label."""
+        self._entity = entity
+
+    def __str__(self) -> str:
+        """Return the entity id with the name of the light."""
+        name = self._entity.name
+        return f"{self._entity.entity_id} ({name})" if name else self._entity.entity_id
+
+
+class KlyqaBulbLog:
+    """Rate limited logging of the repetitive messages of the bulbs.
+
+    Messages are logged with the level checked first and the arguments
+    formatted by logging only when the message is emitted. Per bulb and kind
+    of message the first LOG_RATE_BURST messages of an interval are logged,
+    the rest is counted and reported with the next logged message.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger = LOGGER,
+        burst: int = LOG_RATE_BURST,
+        interval: float = LOG_RATE_INTERVAL,
+    ) -> None:
+        """Initialize the bulb log."""
+        self.logger = logger
+        self.burst = burst
+        self.interval = interval
+        self.suppressed = 0
+        """messages not logged because of the rate limit"""
+        self._windows: dict[tuple[str, str], list[float]] = {}
+        """start, logged and suppressed messages of the interval by bulb and kind"""
+
+    def debug(self, u_id: str, kind: str, msg: str, *args: Any) -> None:
+        """Log a repetitive debug message of the bulb."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.log(logging.DEBUG, u_id, kind, msg, *args)
+
+    def log(self, level: int, u_id: str, kind: str, msg: str, *args: Any) -> None:
+        """Log a repetitive message of the bulb within the rate limit."""
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        key = (u_id, kind)
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                msg += " (%d similar messages suppressed)"
+                args = (*args, int(window[2]))
+            window = self._windows[key] = [now, 0, 0]
+        if window[1] >= self.burst:
+            window[2] += 1
+            self.suppressed += 1
+            return
+        window[1] += 1
+        self.logger.log(level, msg, *args)
+
+    def forget(self, u_id: str) -> None:
+        """Drop the rate limits of a removed bulb."""
+        for key in [key for key in self._windows if key[0] == u_id]:
+            self._windows.pop(key)
@@ -0,0 +1,303 @@
+"""Klyqa fleet poller."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+import hashlib
+import random
+import time
+import traceback
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+import voluptuous as vol
+
+from klyqa_ctl import klyqa_ctl as api
+
+from .command import KlyqaCommand
+from .const import (
+    CONF_POLL_CONCURRENCY,
+    CONF_POLL_MAX_INTERVAL,
+    CONF_POLL_MIN_INTERVAL,
+    DEFAULT_POLL_CONCURRENCY,
+    DEFAULT_POLL_MAX_INTERVAL,
+    DEFAULT_POLL_MIN_INTERVAL,
+    LOGGER,
+)
+from .datacoordinator import HAKlyqaAccount
+from .state import state_snapshot
+
+TIMEOUT_POLL = 11
+POLL_TICK = timedelta(seconds=1)
+"""resolution of the poll schedule"""
+RETRY_FAILURES = 3
+"""polls a bulb is retried often without answer before backing off"""
+POLL_JITTER = 1.0
+"""seconds the polls due in the same tick are spread over"""
+POLL_TIMES_KEPT = 100
+MAX_POLL_CONCURRENCY = 100
+
+POLL_CONFIG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_POLL_CONCURRENCY, default=DEFAULT_POLL_CONCURRENCY): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_POLL_CONCURRENCY)
+        ),
+        vol.Optional(
+            CONF_POLL_MIN_INTERVAL, default=DEFAULT_POLL_MIN_INTERVAL
+        ): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(
+            CONF_POLL_MAX_INTERVAL, default=DEFAULT_POLL_MAX_INTERVAL
+        ): vol.All(vol.Coerce(float), vol.Range(min=1)),
+    }
+)
+"""poll settings of the yaml or config entry data"""
+
+
+def poll_config(config: Mapping[str, Any]) -> dict[str, Any]:
+    """Return the validated poll settings of the config.
+
+    Invalid settings are logged and replaced with their defaults.
+    """
+    settings = {key: config[key] for key in POLL_CONFIG_SCHEMA.schema if key in config}
+    try:
+        return POLL_CONFIG_SCHEMA(settings)
+    except vol.Invalid as err:
+        LOGGER.warning("Invalid klyqa poll settings, using the defaults: %s", err)
+        return POLL_CONFIG_SCHEMA({})
+
+
+def poll_phase(u_id: str) -> float:
+    """Return the stable position (0-1) of the bulb polls in an interval."""
+    digest = hashlib.sha1(u_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32
+
+
+class KlyqaPollSchedule:
+    """Poll interval and due time of one bulb."""
+
+    def __init__(self, interval: float, phase: float) -> None:
+        """Initialize the poll schedule."""
+        self.interval = interval
+        self.phase = phase
+        self.due = 0.0
+        self.state: tuple | None = None
+        self.changes = 0
+        """polls that found a changed state"""
+        self.failures = 0
+        """polls without answer in a row"""
+
+
+class KlyqaFleetPoller:
+    """Poll the state of the bulbs of an account.
+
+    Instead of every light entity requesting its own state, the poller
+    requests the bulbs when they are due. Answers are applied to the light
+    entities as they come in. At most concurrency polls are in flight.
+
+    Every bulb has its own interval. Bulbs whose state changed, that were
+    switched or that just stopped answering are polled every min_interval
+    seconds, the interval of bulbs with an unchanged state or without answer
+    for a while doubles with each poll up to max_interval seconds. Each bulb
+    is polled at its own stable phase of the interval, so the polls don't go
+    out in one burst.
+
+    The settings are clamped so that 1 <= min_interval <= scan interval <=
+    max_interval and 1 <= concurrency <= MAX_POLL_CONCURRENCY.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        klyqa: HAKlyqaAccount,
+        scan_interval: timedelta,
+        concurrency: int = DEFAULT_POLL_CONCURRENCY,
+        min_interval: float = DEFAULT_POLL_MIN_INTERVAL,
+        max_interval: float = DEFAULT_POLL_MAX_INTERVAL,
+    ) -> None:
+        """Initialize the fleet poller."""
+        self.hass = hass
+        self.klyqa = klyqa
+        self.scan_interval = scan_interval.total_seconds()
+        self.concurrency = min(max(1, int(concurrency)), MAX_POLL_CONCURRENCY)
+        self.min_interval = max(1.0, min(float(min_interval), self.scan_interval))
+        # min_interval <= scan_interval <= max_interval
+        self.max_interval = max(
+            float(max_interval), self.scan_interval, self.min_interval
+        )
+        self.schedules: dict[str, KlyqaPollSchedule] = {}
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._pending: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.polls = 0
+        self.poll_times: deque[float] = deque(maxlen=POLL_TIMES_KEPT)
+        """seconds the last polls took from request to answer"""
+
+    def async_start(self) -> CALLBACK_TYPE:
+        """Start polling the due bulbs, return the stop callback."""
+        self.klyqa.poller = self
+        unsub = async_track_time_interval(
+            self.hass,
+            self._async_poll_due,
+            POLL_TICK,
+            name=f"klyqa fleet poll {self.klyqa.username}",
+        )
+
+        def stop() -> None:
+            unsub()
+            for task in list(self._tasks):
+                task.cancel()
+            if self.klyqa.poller is self:
+                self.klyqa.poller = None
+
+        return stop
+
+    def _sync_schedules(self, now: float) -> None:
+        """Schedule new bulbs at their phase, drop removed ones."""
+        for u_id in list(self.schedules):
+            if u_id not in self.klyqa.entities:
+                del self.schedules[u_id]
+        for u_id in self.klyqa.entities:
+            if u_id not in self.schedules:
+                schedule = KlyqaPollSchedule(self.scan_interval, poll_phase(u_id))
+                schedule.due = self._next_due(schedule, now)
+                self.schedules[u_id] = schedule
+
+    @staticmethod
+    def _next_due(
+        schedule: KlyqaPollSchedule, now: float, min_gap: float = 0.0
+    ) -> float:
+        """Return the next time at the phase of the bulb in its interval.
+
+        The time is at least min_gap seconds after now.
+        """
+        period = schedule.interval
+        due = now + (schedule.phase * period - now) % period
+        if due - now < min_gap:
+            due += period
+        return due
+
+    def note_activity(self, u_id: str) -> None:
+        """Poll the bulb often again, it was just switched."""
+        schedule = self.schedules.get(u_id)
+        if schedule is not None:
+            schedule.interval = self.min_interval
+            schedule.due = min(
+                schedule.due,
+                self._next_due(schedule, time.monotonic(), schedule.interval / 2),
+            )
+
+    async def _async_poll_due(self, now: datetime) -> None:
+        monotonic = time.monotonic()
+        self._sync_schedules(monotonic)
+        for u_id, schedule in self.schedules.items():
+            if schedule.due <= monotonic and u_id not in self._pending:
+                self._start_poll(u_id, random.uniform(0, POLL_JITTER))
+
+    def _start_poll(self, u_id: str, delay: float = 0.0) -> asyncio.Task:
+        self._pending.add(u_id)
+        task = self.hass.async_create_background_task(
+            self._async_poll_bulb(u_id, delay), f"klyqa poll {u_id}"
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def async_poll(self, u_ids: list[str] | None = None) -> None:
+        """Request the state of the bulbs, all bulbs with entities by default."""
+        if u_ids is None:
+            u_ids = list(self.klyqa.entities)
+        self._sync_schedules(time.monotonic())
+        tasks = [self._start_poll(u_id) for u_id in u_ids if u_id not in self._pending]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _async_poll_bulb(self, u_id: str, delay: float) -> None:
+        """Poll the bulb once a slot for it is free."""
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            async with self._slots:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                start = time.monotonic()
+                try:
+                    answered = await self._async_request(u_id)
+                finally:
+                    self.in_flight -= 1
+                self.polls += 1
+                self.poll_times.append(time.monotonic() - start)
+                self.klyqa.timings.record("poll", self.poll_times[-1], u_id)
+            self._reschedule(u_id, answered, time.monotonic())
+        finally:
+            self._pending.discard(u_id)
+
+    async def _async_request(self, u_id: str) -> bool:
+        """Request the state of the bulb, return true if it answered."""
+        command = KlyqaCommand().request()
+        self.klyqa.bulb_log.debug(u_id, "poll", "Poll bulb %s", u_id)
+        answered = False
+
+        async def answer_cb(msg: api.Message, uid: str) -> None:
+            nonlocal answered
+            if msg and msg.state == api.Message_state.answered:
+                answered = True
+            await self._async_answer(msg, uid)
+
+        try:
+            await self.klyqa.send_to_bulbs(
+                command.args_parsed([u_id]),
+                command.args_in([u_id]),
+                async_answer_callback=answer_cb,
+                timeout_ms=TIMEOUT_POLL * 1000,
+            )
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.error(traceback.format_exc())
+        return answered
+
+    def stats(self) -> dict[str, Any]:
+        """Return the poll metrics."""
+        times = sorted(self.poll_times)
+        return {
+            "polls": self.polls,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "poll_time_median": times[len(times) // 2] if times else None,
+            "poll_time_max": times[-1] if times else None,
+        }
+
+    def _reschedule(self, u_id: str, answered: bool, now: float) -> None:
+        """Adapt the poll interval of the bulb to its last poll."""
+        schedule = self.schedules.get(u_id)
+        if schedule is None:
+            return
+        if not answered:
+            schedule.failures += 1
+            if schedule.failures <= RETRY_FAILURES:
+                schedule.interval = self.min_interval
+            else:
+                schedule.interval = min(schedule.interval * 2, self.max_interval)
+        else:
+            schedule.failures = 0
+            bulb: Any = self.klyqa.bulbs.get(u_id)
+            state = state_snapshot(bulb.status if bulb else None)
+            if schedule.state is None:
+                pass
+            elif state != schedule.state:
+                schedule.changes += 1
+                schedule.interval = self.min_interval
+            else:
+                schedule.interval = min(schedule.interval * 2, self.max_interval)
+            schedule.state = state
+        schedule.due = self._next_due(schedule, now, schedule.interval / 2)
+
+    async def _async_answer(self, msg: api.Message, uid: str) -> None:
+        """Apply the answer of a bulb to its light entity."""
+        if not msg or msg.state == api.Message_state.unsent:
+            # unreachable bulbs may come back rebooted without stored routine
+            self.klyqa.routine_scenes.pop(uid, None)
+        await self.klyqa.async_apply_answer(msg, uid)
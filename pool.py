@@ -0,0 +1,148 @@
+"""Klyqa bulb connection pool."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable
+import socket
+import time
+
+from klyqa_ctl import klyqa_ctl as api
+
+from .const import LOGGER
+
+POOL_MAX_SIZE = 64
+"""connections kept open while polling, None keeps all"""
+POOL_IDLE_TIMEOUT = 30.0
+"""seconds an unused connection is kept open, None keeps it open"""
+
+
+def close_connection(bulb: api.KlyqaBulb) -> None:
+    """Close the local connection of the bulb."""
+    connection = bulb.local.connection
+    bulb.local.connection = None
+    bulb.local.state = "WAIT_IV"
+    if connection is None:
+        return
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    connection.close()
+
+
+def connection_alive(bulb: api.KlyqaBulb) -> bool:
+    """Return true if the local connection of the bulb is still open."""
+    connection = bulb.local.connection
+    if connection is None or connection.fileno() == -1:
+        return False
+    try:
+        data = connection.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except (BlockingIOError, socket.timeout):
+        return True
+    except OSError:
+        return False
+    # an empty read is the end of the stream
+    return len(data) > 0
+
+
+class KlyqaConnectionPool:
+    """Established, already keyed bulb connections by unit id.
+
+    Connections are reused for the next messages to the bulb so they skip
+    the discovery broadcast and the aes handshake. Connections unused for
+    idle_timeout seconds are closed, the least recently used connection is
+    closed when more than max_size are pooled. While a connection is in the pool,
+    on_readable is called with the bulb when the bulb sends unsolicited data.
+    """
+
+    def __init__(
+        self,
+        max_size: int | None = POOL_MAX_SIZE,
+        idle_timeout: float | None = POOL_IDLE_TIMEOUT,
+        on_readable: Callable[[api.KlyqaBulb], None] | None = None,
+    ) -> None:
+        """Initialize the connection pool."""
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.on_readable = on_readable
+        self._connections: OrderedDict[str, tuple[api.KlyqaBulb, float]] = OrderedDict()
+        self.hits = 0
+        """messages sent on a pooled connection"""
+        self.misses = 0
+        """messages sent on a new connection"""
+
+    def __len__(self) -> int:
+        """Return the number of pooled connections."""
+        return len(self._connections)
+
+    def __contains__(self, u_id: str) -> bool:
+        """Return true if a connection to the bulb is pooled."""
+        return u_id in self._connections
+
+    def _watch(self, bulb: api.KlyqaBulb) -> None:
+        connection = bulb.local.connection
+        if self.on_readable is None or connection is None:
+            return
+        if connection.fileno() != -1:
+            asyncio.get_running_loop().add_reader(
+                connection.fileno(), self.on_readable, bulb
+            )
+
+    def _unwatch(self, bulb: api.KlyqaBulb) -> None:
+        connection = bulb.local.connection
+        if self.on_readable is None or connection is None:
+            return
+        if connection.fileno() != -1:
+            asyncio.get_running_loop().remove_reader(connection.fileno())
+
+    def _remove(self, u_id: str) -> api.KlyqaBulb:
+        bulb, _ = self._connections.pop(u_id)
+        self._unwatch(bulb)
+        return bulb
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return self.idle_timeout is not None and now - last_used > self.idle_timeout
+
+    def put(self, bulb: api.KlyqaBulb) -> None:
+        """Keep the established connection of the bulb for reuse."""
+        self.prune()
+        if bulb.u_id in self._connections:
+            self._remove(bulb.u_id)
+        self._connections[bulb.u_id] = (bulb, time.monotonic())
+        self._watch(bulb)
+        while self.max_size is not None and len(self._connections) > self.max_size:
+            close_connection(self._remove(next(iter(self._connections))))
+
+    def acquire(self, u_id: str) -> api.KlyqaBulb | None:
+        """Take the connection to the bulb out of the pool if it is usable."""
+        if u_id not in self._connections:
+            return None
+        _, last_used = self._connections[u_id]
+        bulb = self._remove(u_id)
+        if (
+            self._expired(last_used, time.monotonic())
+            or bulb.local.state != "CONNECTED"
+            or not connection_alive(bulb)
+        ):
+            LOGGER.debug("Pooled connection to bulb %s is gone.", u_id)
+            close_connection(bulb)
+            return None
+        return bulb
+
+    def discard(self, u_id: str) -> None:
+        """Close and remove the connection to the bulb."""
+        if u_id in self._connections:
+            close_connection(self._remove(u_id))
+
+    def prune(self) -> None:
+        """Close the connections that were idle for too long."""
+        now = time.monotonic()
+        for u_id, (_, last_used) in list(self._connections.items()):
+            if self._expired(last_used, now):
+                close_connection(self._remove(u_id))
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        for u_id in list(self._connections):
+            close_connection(self._remove(u_id))
@@ -0,0 +1,188 @@
+"""Klyqa product profile cache."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+from homeassistant.components.light import ColorMode, LightEntityFeature
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from klyqa_ctl import klyqa_ctl as api
+
+from .const import DOMAIN, LOGGER
+from .scenes import EFFECT_LIST_CWWW, EFFECT_LIST_RGB
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.product_profiles"
+SAVE_DELAY = 10
+PROFILE_TTL = 24 * 60 * 60
+"""seconds until a cached product profile is revalidated"""
+DEFAULT_VALUE_RANGES: dict[str, tuple[int, int]] = {
+    "color": (0, 255),
+    "brightness": (0, 100),
+    "temperature": (2000, 6500),
+}
+"""value ranges klyqa_ctl checks the bulb attributes of a command against"""
+
+
+def schema_range(schema: Any) -> tuple[int, int] | None:
+    """Return the minimum and maximum of a device trait value schema."""
+    if not isinstance(schema, dict):
+        return None
+    if "minimum" in schema and "maximum" in schema:
+        return (int(schema["minimum"]), int(schema["maximum"]))
+    if schema.get("enum"):
+        return (int(min(schema["enum"])), int(max(schema["enum"])))
+    for nested in (
+        *schema.get("properties", {}).values(),
+        *schema.get("definitions", {}).values(),
+    ):
+        if (found := schema_range(nested)) is not None:
+            return found
+    return None
+
+
+def common_value_ranges(
+    profiles: list[KlyqaProductProfile | None],
+) -> dict[str, tuple[int, int]]:
+    """Return the value ranges all of the profiles take."""
+    ranges = dict(DEFAULT_VALUE_RANGES)
+    for profile in profiles:
+        if profile is None:
+            continue
+        for key, (low, high) in profile.value_ranges.items():
+            ranges[key] = (max(ranges[key][0], low), min(ranges[key][1], high))
+    return ranges
+
+
+class KlyqaProductProfile:
+    """Product profile with the capabilities of the product precomputed."""
+
+    def __init__(
+        self, product_id: str, config: dict[str, Any], fetched: float = 0.0
+    ) -> None:
+        """Initialize the product profile."""
+        self.product_id = product_id
+        self.config = config
+        self.fetched = fetched
+
+        device_traits = config.get("deviceTraits") if config else None
+        self.msg_keys: frozenset[str] = frozenset(
+            x["msg_key"] for x in device_traits or [] if "msg_key" in x
+        )
+
+        color_modes = {ColorMode.BRIGHTNESS}
+        self.supported_features = LightEntityFeature(0)
+        self.effect_list: tuple[str, ...] = ()
+        if device_traits:
+            if "temperature" in self.msg_keys:
+                color_modes.add(ColorMode.COLOR_TEMP)
+
+            if "color" in self.msg_keys:
+                color_modes.add(ColorMode.RGB)
+                self.supported_features |= LightEntityFeature.EFFECT
+                self.effect_list = EFFECT_LIST_RGB
+            else:
+                self.effect_list = EFFECT_LIST_CWWW
+        self.color_modes: frozenset[ColorMode] = frozenset(color_modes)
+
+        self.value_ranges = dict(DEFAULT_VALUE_RANGES)
+        for trait in device_traits or []:
+            key = trait.get("msg_key")
+            if key in self.value_ranges:
+                found = schema_range(trait.get("value_schema"))
+                if found is not None:
+                    self.value_ranges[key] = found
+
+    def expired(self) -> bool:
+        """Return true if the profile should be revalidated."""
+        return time.time() - self.fetched > PROFILE_TTL
+
+
+class KlyqaProductProfiles:
+    """Product profiles by product id, shared by all entities.
+
+    Profiles are persisted in the Home Assistant storage, so restarts don't
+    fetch them again. Concurrent requests for the same product share one
+    fetch, expired profiles are revalidated in the background.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the product profile cache."""
+        self.hass = hass
+        self._store: Store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._profiles: dict[str, KlyqaProductProfile] = {}
+        self._fetches: dict[str, asyncio.Task] = {}
+        self._load_task: asyncio.Task | None = None
+
+    async def async_load(self) -> None:
+        """Load the persisted profiles once."""
+        if self._load_task is None:
+            self._load_task = self.hass.async_create_task(self._async_load())
+        await self._load_task
+
+    async def _async_load(self) -> None:
+        try:
+            data = await self._store.async_load()
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.error("Could not load cached device configuration profiles")
+            return
+        for product_id, stored in (data or {}).items():
+            self._add(product_id, stored["config"], stored["fetched"])
+
+    def _add(
+        self, product_id: str, config: dict[str, Any], fetched: float
+    ) -> KlyqaProductProfile:
+        profile = KlyqaProductProfile(product_id, config, fetched)
+        self._profiles[product_id] = profile
+        api.bulb_configs[product_id] = config
+        return profile
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return {
+            product_id: {"config": profile.config, "fetched": profile.fetched}
+            for product_id, profile in self._profiles.items()
+            if profile.fetched
+        }
+
+    async def async_get(
+        self, product_id: str, klyqa: api.Klyqa_account
+    ) -> KlyqaProductProfile | None:
+        """Return the product profile, fetch it with the account if needed."""
+        await self.async_load()
+
+        profile = self._profiles.get(product_id)
+        if profile is None and product_id in api.bulb_configs:
+            profile = self._add(product_id, api.bulb_configs[product_id], 0.0)
+
+        if profile is not None:
+            if profile.fetched and profile.expired():
+                self._fetch(product_id, klyqa)
+            return profile
+
+        return await self._fetch(product_id, klyqa)
+
+    def _fetch(self, product_id: str, klyqa: api.Klyqa_account) -> asyncio.Task:
+        """Fetch the profile, sharing a fetch already in flight."""
+        if product_id not in self._fetches:
+            self._fetches[product_id] = self.hass.async_create_task(
+                self._async_fetch(product_id, klyqa)
+            )
+        return self._fetches[product_id]
+
+    async def _async_fetch(
+        self, product_id: str, klyqa: api.Klyqa_account
+    ) -> KlyqaProductProfile | None:
+        try:
+            config = await klyqa.request("config/product/" + product_id, timeout=30)
+        except Exception:  # pylint: disable=bare-except,broad-except
+            LOGGER.error("Could not load device configuration profile %s", product_id)
+            return self._profiles.get(product_id)
+        finally:
+            self._fetches.pop(product_id, None)
+
+        profile = self._add(product_id, config, time.time())
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+        return profile
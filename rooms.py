@@ -0,0 +1,127 @@
+"""Klyqa room synchronisation."""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any
+
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import area_registry as ar, entity_registry as er
+from homeassistant.helpers.debounce import Debouncer
+
+from .const import DOMAIN, LOGGER
+
+ROOM_SYNC_DELAY = 1.0
+"""seconds the room sync waits for more entities or settings changes"""
+
+
+def rooms_hash(rooms: list[dict[str, Any]]) -> str:
+    """Return a hash of the rooms structure of the account settings."""
+    data = json.dumps(rooms, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class KlyqaRoomSync:
+    """Put the light entities of an account into the areas of their rooms.
+
+    One pass goes over all lights of the account, creates the missing areas
+    and moves the entities into the area of their first klyqa room. Lights
+    without a room are taken out of their area. The registries save the
+    changes of a pass debounced in one write.
+
+    A pass is skipped while the rooms of the account settings keep their
+    hash and no light was added. Otherwise only the lights that are new or
+    whose room changed are moved.
+    """
+
+    def __init__(self, hass: HomeAssistant, klyqa: Any) -> None:
+        """Initialize the room sync."""
+        self.hass = hass
+        self.klyqa = klyqa
+        self._debouncer: Debouncer = Debouncer(
+            hass,
+            LOGGER,
+            cooldown=ROOM_SYNC_DELAY,
+            immediate=False,
+            function=self.async_reconcile,
+        )
+        self._rooms_hash: str | None = None
+        self._synced: dict[str, str | None] = {}
+        """room name the light was put into by bulb unit id"""
+        self.skipped = 0
+        """passes without changed rooms or new lights"""
+        self.executed = 0
+        """passes that moved the affected lights"""
+
+    @callback
+    def async_schedule(self) -> None:
+        """Run a pass once the entities and settings stopped changing."""
+        if self.klyqa.sync_rooms:
+            self._debouncer.async_schedule_call()
+
+    @callback
+    def async_cancel(self) -> None:
+        """Cancel a scheduled pass."""
+        self._debouncer.async_cancel()
+
+    def stats(self) -> dict[str, Any]:
+        """Return the room sync metrics."""
+        return {"skipped": self.skipped, "executed": self.executed}
+
+    def _room_name(self, u_id: str) -> str | None:
+        rooms = self.klyqa.room_index.get(u_id, [])
+        # only 1 room supported per device by ha
+        return rooms[0]["name"] if rooms else None
+
+    @callback
+    def async_reconcile(self) -> None:
+        """Move the light entities whose room changed into its area."""
+        if not self.klyqa.sync_rooms:
+            return
+        for u_id in list(self._synced):
+            if u_id not in self.klyqa.entities:
+                del self._synced[u_id]
+
+        acc_settings = self.klyqa.acc_settings or {}
+        current_hash = rooms_hash(acc_settings.get("rooms", []))
+        rooms_changed = current_hash != self._rooms_hash
+        affected = [
+            u_id
+            for u_id in self.klyqa.entities
+            if u_id not in self._synced
+            or (rooms_changed and self._synced[u_id] != self._room_name(u_id))
+        ]
+        self._rooms_hash = current_hash
+        if not affected:
+            self.skipped += 1
+            return
+        self.executed += 1
+
+        area_registry = ar.async_get(self.hass)
+        entity_registry = er.async_get(self.hass)
+        moved = 0
+
+        for u_id in affected:
+            entity_id = entity_registry.async_get_entity_id(
+                Platform.LIGHT, DOMAIN, u_id
+            )
+            entry = entity_registry.async_get(entity_id) if entity_id else None
+            if entry is None:
+                continue
+
+            room_name = self._room_name(u_id)
+            self._synced[u_id] = room_name
+            if room_name is None:
+                if entry.area_id:
+                    entity_registry.async_update_entity(entry.entity_id, area_id=None)
+                    moved += 1
+                continue
+
+            area = area_registry.async_get_or_create(room_name)
+            if entry.area_id != area.id:
+                LOGGER.info("Add bulb %s to room %s", entry.entity_id, area.name)
+                entity_registry.async_update_entity(entry.entity_id, area_id=area.id)
+                moved += 1
+
+        LOGGER.debug("Room sync moved %s of %s affected lights.", moved, len(affected))
@@ -0,0 +1,43 @@
+"""Klyqa scene registry."""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from klyqa_ctl import klyqa_ctl as api
+
+
+class KlyqaScene(NamedTuple):
+    """Scene with its routine commands prepared for the bulb."""
+
+    id: int
+    label: str
+    commands: tuple[str, ...]
+    """single commands of the scene"""
+    routine_commands: str
+    """commands to put as routine, looping for scenes with more than one step"""
+    cwww: bool
+
+
+def _make_scene(scene: dict) -> KlyqaScene:
+    commands = scene["commands"]
+    routine_commands = commands
+    if len(commands.split(";")) > 2:
+        routine_commands += "l 0;"
+    return KlyqaScene(
+        id=scene["id"],
+        label=scene["label"],
+        commands=tuple(x for x in commands.split(";") if x),
+        routine_commands=routine_commands,
+        cwww="cwww" in scene,
+    )
+
+
+SCENES: tuple[KlyqaScene, ...] = tuple(_make_scene(x) for x in api.SCENES)
+
+SCENES_BY_LABEL: dict[str, KlyqaScene] = {x.label: x for x in reversed(SCENES)}
+SCENES_BY_ID: dict[str, KlyqaScene] = {str(x.id): x for x in reversed(SCENES)}
+
+EFFECT_LIST_RGB: tuple[str, ...] = tuple(x.label for x in SCENES)
+"""effects of color bulbs"""
+EFFECT_LIST_CWWW: tuple[str, ...] = tuple(x.label for x in SCENES if x.cwww)
+"""effects of white tone bulbs"""
@@ -0,0 +1,80 @@
+"""Support for klyqa timing sensors."""
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .datacoordinator import HAKlyqaAccount
+from .timings import PHASES
+
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Set up the timing sensors of the klyqa account."""
+    klyqa: HAKlyqaAccount | None = hass.data[DOMAIN].entries.get(entry.entry_id)
+    if not klyqa:
+        return
+
+    async_add_entities([KlyqaTimingSensor(klyqa, entry, phase) for phase in PHASES])
+
+
+class KlyqaTimingSensor(SensorEntity):
+    """Median duration of a phase of the command or poll path.
+
+    Disabled by default. Timing of the account is only on while one of these
+    sensors is enabled.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:timer-outline"
+
+    def __init__(self, klyqa: HAKlyqaAccount, entry: ConfigEntry, phase: str) -> None:
+        """Initialize the timing sensor."""
+        self._klyqa = klyqa
+        self._phase = phase
+        self._attr_name = f"Klyqa {klyqa.username} {phase.replace('_', ' ')} time"
+        self._attr_unique_id = f"{entry.entry_id}_{phase}_time"
+
+    async def async_added_to_hass(self) -> None:
+        """Turn timing of the account on while the sensor is added."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._klyqa.timings.subscribe())
+
+    def _summary(self) -> dict[str, Any] | None:
+        histogram = self._klyqa.timings.phases.get(self._phase)
+        return histogram.as_dict() if histogram else None
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the median duration in milliseconds."""
+        summary = self._summary()
+        return summary["p50_ms"] if summary else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the count and the upper percentiles."""
+        summary = self._summary()
+        if not summary:
+            return None
+        return {
+            key: summary[key]
+            for key in ("count", "mean_ms", "p90_ms", "p99_ms", "max_ms")
+        }
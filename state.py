@@ -0,0 +1,97 @@
+"""Klyqa light state."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.light import ColorMode
+import homeassistant.util.color as color_util
+from klyqa_ctl import klyqa_ctl as api
+
+from .scenes import SCENES_BY_ID
+
+
+def state_snapshot(status: api.KlyqaBulbResponseStatus | None) -> tuple | None:
+    """Return the bulb state values that matter for change detection."""
+    if status is None:
+        return None
+    color = status.color
+    return (
+        status.status,
+        status.brightness,
+        (color.r, color.g, color.b) if isinstance(color, api.RGBColor) else color,
+        status.temperature,
+        status.mode,
+        status.active_scene,
+    )
+
+
+class KlyqaLightState:
+    """State of a light with the values Home Assistant shows.
+
+    The values are converted from a bulb status only when the status differs
+    from the last one taken, so unchanged answers and pushes cost a tuple
+    compare.
+    """
+
+    __slots__ = (
+        "snapshot",
+        "is_on",
+        "brightness",
+        "color_temp",
+        "rgb_color",
+        "hs_color",
+        "color_mode",
+        "effect",
+    )
+
+    def __init__(self) -> None:
+        """Initialize the light state."""
+        self.snapshot: tuple | None = None
+        self.is_on: bool | None = None
+        self.brightness: int | None = None
+        self.color_temp: int | None = None
+        self.rgb_color: tuple[int, int, int] | None = None
+        self.hs_color: tuple[float, float] | None = None
+        self.color_mode: Any = None
+        self.effect: str | None = None
+
+    def invalidate(self) -> None:
+        """Take the next status even if it equals the last one."""
+        self.snapshot = None
+
+    def update(self, status: api.KlyqaBulbResponseStatus) -> bool:
+        """Take the values of the bulb status, return True if they changed."""
+        snapshot = state_snapshot(status)
+        if snapshot == self.snapshot:
+            return False
+        self.snapshot = snapshot
+
+        self.color_temp = (
+            color_util.color_temperature_kelvin_to_mired(float(status.temperature))
+            if status.temperature
+            else 0
+        )
+        if isinstance(status.color, api.RGBColor):
+            self.rgb_color = (
+                int(status.color.r),
+                int(status.color.g),
+                int(status.color.b),
+            )
+            self.hs_color = color_util.color_RGB_to_hs(*self.rgb_color)
+
+        self.brightness = int((float(status.brightness) / 100) * 255)
+        self.is_on = status.status == "on"
+
+        self.color_mode = (
+            ColorMode.COLOR_TEMP
+            if status.mode == "cct"
+            else "effect"
+            if status.mode == "cmd"
+            else status.mode
+        )
+        self.effect = ""
+        if status.mode == "cmd":
+            scene = SCENES_BY_ID.get(str(status.active_scene))
+            if scene:
+                self.effect = scene.label
+        return True
@@ -0,0 +1,11 @@
+"""Make the integration importable as custom component for the tests."""
+import os
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_root = tempfile.mkdtemp(prefix="klyqa-tests-")
+os.makedirs(os.path.join(_root, "custom_components"))
+os.symlink(REPO, os.path.join(_root, "custom_components", "klyqa"))
+sys.path.insert(0, _root)
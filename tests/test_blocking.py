@@ -0,0 +1,25 @@
+"""Tests for the klyqa event loop blocking detection setup."""
+import os
+import subprocess
+import sys
+
+import custom_components
+
+
+def test_classes_imported_lazily() -> None:
+    """The integration imports the platforms only for the detection."""
+    code = (
+        "import sys\n"
+        "import custom_components.klyqa as klyqa\n"
+        "assert 'custom_components.klyqa.light' not in sys.modules\n"
+        "classes = klyqa.blocking_classes()\n"
+        "assert 'custom_components.klyqa.light' in sys.modules\n"
+        "assert {cls.__name__ for cls in classes} >= {'KlyqaLight', 'HAKlyqaAccount'}\n"
+    )
+    root = os.path.dirname(list(custom_components.__path__)[0])
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": root},
+    )
@@ -0,0 +1,108 @@
+"""Tests for the klyqa bulb commands."""
+import asyncio
+
+from klyqa_ctl import klyqa_ctl as api
+
+from custom_components.klyqa.command import KlyqaCommand, KlyqaCommandQueue
+
+
+def test_update_replaces_values() -> None:
+    """Newer values replace older ones, other values are kept."""
+    command = KlyqaCommand().power(True).brightness(20)
+    command.update(KlyqaCommand().brightness(80).transition(500))
+    assert command.args == [
+        "--power",
+        "on",
+        "--brightness",
+        "80",
+        "--transitionTime",
+        "500",
+    ]
+
+
+def test_update_color_replaces_temperature() -> None:
+    """The bulb shows one of color and temperature, the newer one wins."""
+    command = KlyqaCommand().temperature(2700).brightness(50)
+    command.update(KlyqaCommand().color(255, 0, 0))
+    assert command.frame() == {
+        "type": "request",
+        "color": {"red": "255", "green": "0", "blue": "0"},
+        "brightness": {"percentage": "50"},
+    }
+
+
+def test_frame() -> None:
+    """Lamp attributes and power are sent in one request frame."""
+    command = (
+        KlyqaCommand().power(True).temperature(3000).brightness(40).transition(250)
+    )
+    assert command.frame() == {
+        "type": "request",
+        "status": "on",
+        "temperature": "3000",
+        "brightness": {"percentage": "40"},
+        "transitionTime": 250,
+    }
+    assert command.frame_msg()[1] == 250
+    assert command.msg_keys() == {"temperature"}
+
+
+def test_frame_not_combinable() -> None:
+    """Routines, requests and empty commands have no request frame."""
+    assert KlyqaCommand().frame() is None
+    assert KlyqaCommand().request().frame() is None
+    assert KlyqaCommand().power(True).routine_start(0).frame() is None
+
+
+def test_args_parsed_matches_parser() -> None:
+    """The namespace equals the one klyqa_ctl parses from the arguments."""
+    command = KlyqaCommand().power(True).color(1, 2, 3).transition(500)
+    parser = api.get_description_parser()
+    api.add_config_args(parser=parser)
+    api.add_command_args(parser=parser)
+    expected = parser.parse_args(args=command.args_in(["abc"]))
+    assert vars(command.args_parsed(["abc"])) == vars(expected)
+
+
+def test_queue_coalesces_pending_commands() -> None:
+    """Commands arriving during a send are merged into one transmission."""
+    sent: list[list[str]] = []
+    release = asyncio.Event()
+
+    async def send(command: KlyqaCommand) -> None:
+        sent.append(command.args)
+        await release.wait()
+
+    async def run() -> KlyqaCommandQueue:
+        queue = KlyqaCommandQueue(send)
+        first = asyncio.create_task(queue.async_send(KlyqaCommand().brightness(10)))
+        await asyncio.sleep(0)
+        others = [
+            asyncio.create_task(queue.async_send(KlyqaCommand().brightness(value)))
+            for value in (20, 30)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *others)
+        return queue
+
+    queue = asyncio.run(run())
+    assert sent == [["--brightness", "10"], ["--brightness", "30"]]
+    assert queue.sent == 2
+    assert queue.coalesced == 1
+
+
+def test_clamp() -> None:
+    """Out of range attributes are limited to the range of the bulb."""
+    command = KlyqaCommand().color(300, -5, 10).brightness(150).temperature(7000)
+    command.clamp(
+        {"color": (0, 255), "brightness": (0, 100), "temperature": (2700, 6500)}
+    )
+    assert command.frame() == {
+        "type": "request",
+        "color": {"red": "255", "green": "0", "blue": "10"},
+        "brightness": {"percentage": "100"},
+        "temperature": "6500",
+    }
+    command = KlyqaCommand().percent_color(120, 0, 0, 0, -1)
+    assert command.clamp({}).args == ["--percent_color", "100", "0", "0", "0", "0"]
@@ -0,0 +1,48 @@
+"""Tests for the klyqa light helpers."""
+import asyncio
+
+import pytest
+
+from custom_components.klyqa import light
+from custom_components.klyqa.command import KlyqaCommand
+
+
+def _send_then_power_on(
+    monkeypatch: pytest.MonkeyPatch,
+    command: KlyqaCommand,
+    transition_time: int | None,
+) -> list:
+    events: list = []
+    real_sleep = asyncio.sleep
+
+    async def send(sent: KlyqaCommand) -> None:
+        events.append(list(sent.args))
+
+    async def sleep(seconds: float) -> None:
+        events.append(("sleep", seconds))
+        await real_sleep(0)
+
+    monkeypatch.setattr(light.asyncio, "sleep", sleep)
+    asyncio.run(light.async_send_then_power_on(send, command, transition_time))
+    monkeypatch.undo()
+    return events
+
+
+def test_send_then_power_on(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The attributes go first, the power on after the delay."""
+    events = _send_then_power_on(monkeypatch, KlyqaCommand().brightness(50), 500)
+    assert events == [
+        ["--brightness", "50", "--transitionTime", "500"],
+        ("sleep", light.POWER_ON_DELAY),
+        ["--power", "on", "--transitionTime", "500"],
+    ]
+
+
+def test_send_then_power_on_without_attributes(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Without attributes only the power on is sent, without a delay."""
+    events = _send_then_power_on(monkeypatch, KlyqaCommand(), None)
+    assert events == [["--power", "on"]]
+    # the stub is gone again for the other tests
+    assert asyncio.sleep.__module__ == "asyncio.tasks"
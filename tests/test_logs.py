@@ -0,0 +1,48 @@
+"""Tests for the klyqa rate limited bulb log."""
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.klyqa import logs
+from custom_components.klyqa.logs import KlyqaBulbLog
+
+BULB_1 = "00000000000000000001"
+BULB_2 = "00000000000000000002"
+
+
+class _Records(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def test_rate_limit_per_bulb_and_kind(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Each bulb and kind logs burst messages per interval."""
+    now = [100.0]
+    monkeypatch.setattr(logs, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    logger = logging.getLogger("klyqa.tests.logs")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    records = _Records()
+    logger.addHandler(records)
+    bulb_log = KlyqaBulbLog(logger, burst=2, interval=60.0)
+
+    for index in range(5):
+        bulb_log.debug(BULB_1, "send", "send %s", index)
+    bulb_log.debug(BULB_1, "answer", "answer")
+    bulb_log.debug(BULB_2, "send", "send %s", 0)
+    assert records.messages == ["send 0", "send 1", "answer", "send 0"]
+    assert bulb_log.suppressed == 3
+
+    now[0] += 60.0
+    bulb_log.debug(BULB_1, "send", "send %s", 5)
+    assert records.messages[-1] == "send 5 (3 similar messages suppressed)"
+
+    logger.setLevel(logging.INFO)
+    bulb_log.debug(BULB_2, "send", "send %s", 1)
+    assert len(records.messages) == 5
+    logger.removeHandler(records)
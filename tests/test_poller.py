@@ -0,0 +1,143 @@
+"""Tests for the klyqa fleet poll schedule."""
+from datetime import timedelta
+from types import SimpleNamespace
+
+from klyqa_ctl import klyqa_ctl as api
+
+from custom_components.klyqa.const import (
+    CONF_POLL_CONCURRENCY,
+    CONF_POLL_MAX_INTERVAL,
+    CONF_POLL_MIN_INTERVAL,
+    DEFAULT_POLL_CONCURRENCY,
+    DEFAULT_POLL_MAX_INTERVAL,
+    DEFAULT_POLL_MIN_INTERVAL,
+)
+from custom_components.klyqa.poller import (
+    MAX_POLL_CONCURRENCY,
+    RETRY_FAILURES,
+    KlyqaFleetPoller,
+    KlyqaPollSchedule,
+    poll_config,
+    poll_phase,
+)
+
+U_ID = "00000000000000000001"
+
+
+def _poller() -> KlyqaFleetPoller:
+    klyqa = SimpleNamespace(bulbs={}, entities={U_ID: None})
+    poller = KlyqaFleetPoller(
+        None, klyqa, timedelta(seconds=30), min_interval=5, max_interval=300
+    )
+    poller._sync_schedules(0.0)
+    return poller
+
+
+def _answer(poller: KlyqaFleetPoller, brightness: int, now: float) -> None:
+    status = SimpleNamespace(
+        status="on",
+        brightness=brightness,
+        color=api.RGBColor(255, 255, 255),
+        temperature=2700,
+        mode="cct",
+        active_scene="0",
+    )
+    poller.klyqa.bulbs[U_ID] = SimpleNamespace(status=status)
+    poller._reschedule(U_ID, True, now)
+
+
+def test_poll_phase_stable_and_spread() -> None:
+    """The phase of a bulb never changes, the phases cover the interval."""
+    u_ids = [f"{index:020x}" for index in range(1000)]
+    phases = [poll_phase(u_id) for u_id in u_ids]
+    assert phases == [poll_phase(u_id) for u_id in u_ids]
+    assert all(0 <= phase < 1 for phase in phases)
+    deciles = [0] * 10
+    for phase in phases:
+        deciles[int(phase * 10)] += 1
+    assert min(deciles) > 60 and max(deciles) < 140
+
+
+def test_next_due_at_phase() -> None:
+    """Polls are due at the phase of the bulb, at least min_gap from now."""
+    schedule = KlyqaPollSchedule(30, 0.5)
+    assert KlyqaFleetPoller._next_due(schedule, 0.0) == 15.0
+    assert KlyqaFleetPoller._next_due(schedule, 20.0) == 45.0
+    assert KlyqaFleetPoller._next_due(schedule, 10.0, min_gap=10) == 45.0
+
+
+def test_unchanged_state_backs_off() -> None:
+    """The interval doubles while the state is unchanged, up to the maximum."""
+    poller = _poller()
+    schedule = poller.schedules[U_ID]
+    assert schedule.interval == 30
+    _answer(poller, 50, 0.0)
+    assert schedule.interval == 30
+    intervals = []
+    for _ in range(5):
+        _answer(poller, 50, 0.0)
+        intervals.append(schedule.interval)
+    assert intervals == [60, 120, 240, 300, 300]
+    assert schedule.due >= schedule.interval / 2
+
+
+def test_changed_state_polls_often() -> None:
+    """A changed state or a switch brings the interval down to the minimum."""
+    poller = _poller()
+    schedule = poller.schedules[U_ID]
+    _answer(poller, 50, 0.0)
+    _answer(poller, 50, 0.0)
+    assert schedule.interval == 60
+    _answer(poller, 80, 0.0)
+    assert schedule.interval == 5
+    assert schedule.changes == 1
+    _answer(poller, 80, 0.0)
+    assert schedule.interval == 10
+    poller.note_activity(U_ID)
+    assert schedule.interval == 5
+
+
+def test_failures_retry_then_back_off() -> None:
+    """Bulbs without answer are retried often, then less and less."""
+    poller = _poller()
+    schedule = poller.schedules[U_ID]
+    intervals = []
+    for _ in range(RETRY_FAILURES + 3):
+        poller._reschedule(U_ID, False, 0.0)
+        intervals.append(schedule.interval)
+    assert intervals == [5] * RETRY_FAILURES + [10, 20, 40]
+    _answer(poller, 50, 0.0)
+    assert schedule.failures == 0
+
+
+def test_poll_config_validated() -> None:
+    """Missing poll settings get defaults, invalid ones fall back to them."""
+    defaults = {
+        CONF_POLL_CONCURRENCY: DEFAULT_POLL_CONCURRENCY,
+        CONF_POLL_MIN_INTERVAL: DEFAULT_POLL_MIN_INTERVAL,
+        CONF_POLL_MAX_INTERVAL: DEFAULT_POLL_MAX_INTERVAL,
+    }
+    assert poll_config({"polling": True}) == defaults
+    assert poll_config({CONF_POLL_CONCURRENCY: "4", CONF_POLL_MAX_INTERVAL: "60"}) == {
+        **defaults,
+        CONF_POLL_CONCURRENCY: 4,
+        CONF_POLL_MAX_INTERVAL: 60.0,
+    }
+    assert poll_config({CONF_POLL_CONCURRENCY: 0}) == defaults
+    assert poll_config({CONF_POLL_MIN_INTERVAL: "often"}) == defaults
+
+
+def test_poller_settings_clamped() -> None:
+    """The poller keeps its settings in range whatever it is given."""
+    klyqa = SimpleNamespace(bulbs={}, entities={})
+    poller = KlyqaFleetPoller(
+        None, klyqa, timedelta(seconds=30), 0, min_interval=600, max_interval=0
+    )
+    assert poller.concurrency == 1
+    assert poller.min_interval == 30
+    assert poller.max_interval == 30
+    poller = KlyqaFleetPoller(
+        None, klyqa, timedelta(seconds=0.5), 10**6, min_interval=0, max_interval=0
+    )
+    assert poller.concurrency == MAX_POLL_CONCURRENCY
+    assert poller.min_interval == poller.max_interval == 1
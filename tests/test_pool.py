@@ -0,0 +1,113 @@
+"""Tests for the klyqa bulb connection pool."""
+import asyncio
+import socket
+
+from klyqa_ctl import klyqa_ctl as api
+
+from custom_components.klyqa.datacoordinator import HAKlyqaAccount
+from custom_components.klyqa.pool import POOL_MAX_SIZE
+
+
+def _fill_pool(polling: bool, count: int) -> tuple[HAKlyqaAccount, list]:
+    account = HAKlyqaAccount(None, None)
+    account.set_polling(polling)
+    bulbs = []
+    for index in range(count):
+        connection, peer = socket.socketpair()
+        bulb = api.KlyqaBulb()
+        bulb.u_id = f"{index:020x}"
+        bulb.local.connection = connection
+        bulb.local.state = "CONNECTED"
+        bulb.peer = peer
+        bulbs.append(bulb)
+        account.connection_pool.put(bulb)
+    return account, bulbs
+
+
+def _close(account: HAKlyqaAccount, bulbs: list) -> None:
+    account.connection_pool.close()
+    for bulb in bulbs:
+        bulb.peer.close()
+
+
+def test_polling_evicts_least_recently_used() -> None:
+    """While polling, the least recently used connections are closed."""
+
+    async def run() -> None:
+        account, bulbs = _fill_pool(True, POOL_MAX_SIZE + 10)
+        try:
+            assert len(account.connection_pool) == POOL_MAX_SIZE
+            assert bulbs[0].u_id not in account.connection_pool
+            assert bulbs[0].local.connection is None
+            assert bulbs[-1].u_id in account.connection_pool
+        finally:
+            _close(account, bulbs)
+
+    asyncio.run(run())
+
+
+def test_push_mode_keeps_all_connections() -> None:
+    """Without polling, fleets larger than the pool keep all connections."""
+
+    async def run() -> None:
+        account, bulbs = _fill_pool(False, POOL_MAX_SIZE + 36)
+        try:
+            assert len(account.connection_pool) == len(bulbs)
+            for bulb in bulbs:
+                assert account.connection_pool.acquire(bulb.u_id) is bulb
+                account.connection_pool.put(bulb)
+
+            account.set_polling(True)
+            account.connection_pool.put(bulbs[0])
+            assert len(account.connection_pool) == POOL_MAX_SIZE
+        finally:
+            _close(account, bulbs)
+
+    asyncio.run(run())
+
+
+def test_new_connection_replaces_pooled_one() -> None:
+    """A new connection of a pooled bulb drops the watched old one."""
+
+    async def run() -> None:
+        account, bulbs = _fill_pool(False, 2)
+        old_connection = bulbs[0].local.connection
+        connection, peer = socket.socketpair()
+
+        async def handle(bulb: api.KlyqaBulb, pooled: bool = False) -> None:
+            return None
+
+        account.bulb_handle_local_tcp = handle
+        try:
+            await account.async_handle_connection(
+                connection, ("127.0.0.1", 3333), bulbs[0].u_id
+            )
+            assert bulbs[0].u_id not in account.connection_pool
+            assert old_connection.fileno() == -1
+            assert bulbs[1].u_id in account.connection_pool
+        finally:
+            _close(account, bulbs)
+            connection.close()
+            peer.close()
+
+    asyncio.run(run())
+
+
+def test_stop_closes_the_pool() -> None:
+    """Stopping the account closes its pooled connections."""
+
+    async def run() -> None:
+        account, bulbs = _fill_pool(False, 3)
+        account.search_and_send_loop_task = asyncio.create_task(
+            account.search_and_send_to_bulb()
+        )
+        await asyncio.sleep(0)
+        try:
+            await account.async_stop()
+            assert account.search_and_send_loop_task.done()
+            assert len(account.connection_pool) == 0
+            assert all(bulb.local.connection is None for bulb in bulbs)
+        finally:
+            _close(account, bulbs)
+
+    asyncio.run(run())
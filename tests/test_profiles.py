@@ -0,0 +1,50 @@
+"""Tests for the klyqa product profiles."""
+from homeassistant.components.light import ColorMode
+
+from custom_components.klyqa.profiles import (
+    DEFAULT_VALUE_RANGES,
+    KlyqaProductProfile,
+    common_value_ranges,
+)
+
+
+def test_value_ranges_from_traits() -> None:
+    """Ranges come from the trait value schemas, defaults fill the gaps."""
+    profile = KlyqaProductProfile(
+        "@klyqa.lighting.cw-ww.e27",
+        {
+            "deviceTraits": [
+                {
+                    "msg_key": "brightness",
+                    "value_schema": {
+                        "properties": {"brightness": {"minimum": 1, "maximum": 100}}
+                    },
+                },
+                {
+                    "msg_key": "temperature",
+                    "value_schema": {"enum": [2700, 4000, 6500]},
+                },
+            ]
+        },
+    )
+    assert profile.value_ranges == {
+        "color": DEFAULT_VALUE_RANGES["color"],
+        "brightness": (1, 100),
+        "temperature": (2700, 6500),
+    }
+    assert ColorMode.COLOR_TEMP in profile.color_modes
+
+
+def test_common_value_ranges() -> None:
+    """A group takes the values all of its bulbs take."""
+    narrow = KlyqaProductProfile(
+        "narrow",
+        {
+            "deviceTraits": [
+                {"msg_key": "temperature", "value_schema": {"enum": [2700, 5000]}}
+            ]
+        },
+    )
+    ranges = common_value_ranges([narrow, None, KlyqaProductProfile("none", {})])
+    assert ranges["temperature"] == (2700, 5000)
+    assert ranges["brightness"] == DEFAULT_VALUE_RANGES["brightness"]
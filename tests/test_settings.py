@@ -0,0 +1,191 @@
+"""Tests for the klyqa account settings changes."""
+import asyncio
+import tempfile
+from typing import Any
+
+from homeassistant import config_entries
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.klyqa.const import (
+    DOMAIN,
+    EVENT_KLYQA_NEW_LIGHT_GROUPS,
+    EVENT_KLYQA_NEW_LIGHTS,
+)
+from custom_components.klyqa.datacoordinator import (
+    HAKlyqaAccount,
+    KlyqaSettingsSnapshot,
+    settings_diff,
+)
+
+KEPT = "00000000000000000001"
+CHANGED = "00000000000000000002"
+MOVED = "00000000000000000003"
+REMOVED = "00000000000000000004"
+ADDED = "00000000000000000005"
+
+
+def _device(u_id: str, name: str = "Bulb") -> dict:
+    return {"localDeviceId": u_id, "name": name}
+
+
+def _group(group_id: str, *members: str, name: str = "Group") -> dict:
+    return {
+        "id": group_id,
+        "name": name,
+        "devices": [_device(u_id) for u_id in members],
+    }
+
+
+def test_settings_diff() -> None:
+    """Added, removed and changed devices and groups are told apart."""
+    old = KlyqaSettingsSnapshot(
+        devices={u_id: _device(u_id) for u_id in (KEPT, CHANGED, MOVED, REMOVED)},
+        groups={
+            "g1": _group("g1", KEPT),
+            "g2": _group("g2", KEPT),
+            "g4": _group("g4", KEPT, MOVED),
+            "g5": _group("g5", KEPT),
+        },
+        rooms={KEPT: (("r1", "Kitchen"),), MOVED: (("r1", "Kitchen"),)},
+    )
+    new = KlyqaSettingsSnapshot(
+        devices={
+            KEPT: _device(KEPT),
+            CHANGED: _device(CHANGED, "Renamed"),
+            MOVED: _device(MOVED),
+            ADDED: _device(ADDED),
+        },
+        groups={
+            "g1": _group("g1", KEPT),
+            "g3": _group("g3", KEPT),
+            "g4": _group("g4", KEPT, ADDED),
+            "g5": _group("g5", KEPT, name="Renamed"),
+        },
+        rooms={KEPT: (("r1", "Kitchen"),), MOVED: (("r2", "Hall"),)},
+    )
+    diff = settings_diff(old, new)
+    assert diff.added_devices == [ADDED]
+    assert diff.removed_devices == [REMOVED]
+    assert diff.changed_devices == [CHANGED, MOVED]
+    assert diff.added_groups == ["g3"]
+    assert diff.removed_groups == ["g2"]
+    assert diff.changed_groups == ["g4", "g5"]
+
+    unchanged = settings_diff(new, new)
+    assert not any(unchanged)
+
+
+def test_settings_diff_first_run() -> None:
+    """Without earlier settings everything is added."""
+    new = KlyqaSettingsSnapshot({KEPT: _device(KEPT)}, {"g1": _group("g1", KEPT)}, {})
+    diff = settings_diff(None, new)
+    assert diff.added_devices == [KEPT]
+    assert diff.added_groups == ["g1"]
+    assert not diff.removed_devices and not diff.changed_devices
+
+
+def test_registered_removals() -> None:
+    """Registered lights and groups gone from the account are removed."""
+
+    async def run() -> dict:
+        hass = HomeAssistant(tempfile.mkdtemp())
+        await er.async_load(hass)
+        entry = config_entries.ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title="test",
+            data={},
+            source=config_entries.SOURCE_USER,
+        )
+        registry = er.async_get(hass)
+        for unique_id in (KEPT, REMOVED, "light.g1", "light.g2"):
+            registry.async_get_or_create("light", DOMAIN, unique_id, config_entry=entry)
+        registry.async_get_or_create("light", "other", MOVED, config_entry=entry)
+
+        account = HAKlyqaAccount(None, None, hass=hass)
+        snapshot = KlyqaSettingsSnapshot(
+            {KEPT: _device(KEPT)}, {"g1": _group("g1", KEPT)}, {}
+        )
+        assert account._registered_removals(snapshot) == {}
+        account.entry_id = entry.entry_id
+        removals = account._registered_removals(snapshot)
+        await hass.async_stop(force=True)
+        return removals
+
+    assert asyncio.run(run()) == {
+        "removed_devices": [REMOVED],
+        "removed_groups": ["g2"],
+    }
+
+
+def test_registry_removals_need_fresh_settings() -> None:
+    """Cached or stale settings never remove registered lights."""
+
+    async def run() -> list[list[str]]:
+        hass = HomeAssistant(tempfile.mkdtemp())
+        await er.async_load(hass)
+        entry = config_entries.ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title="test",
+            data={},
+            source=config_entries.SOURCE_USER,
+        )
+        registry = er.async_get(hass)
+        for unique_id in (KEPT, REMOVED):
+            registry.async_get_or_create("light", DOMAIN, unique_id, config_entry=entry)
+        for event in (EVENT_KLYQA_NEW_LIGHTS, EVENT_KLYQA_NEW_LIGHT_GROUPS):
+            hass.bus.async_listen(event, lambda event: None)
+
+        account = HAKlyqaAccount(None, None, hass=hass)
+        account.entry_id = entry.entry_id
+        account.room_sync = None
+        # settings of the login cache, the cloud is offline
+        account.acc_settings = {
+            "devices": [{**_device(KEPT), "productId": "@klyqa.lighting.test"}]
+        }
+        cloud: list[dict] = []
+
+        async def request(url: str, **kwargs: Any) -> dict:
+            if not cloud:
+                raise OSError("offline")
+            return cloud[0]
+
+        account.request = request
+        registered = []
+        for online in (False, True):
+            if online:
+                cloud.append(account.acc_settings)
+            await account.update_account()
+            registered.append(
+                sorted(
+                    entity.unique_id
+                    for entity in er.async_entries_for_config_entry(
+                        registry, entry.entry_id
+                    )
+                )
+            )
+        await hass.async_stop(force=True)
+        return registered
+
+    assert asyncio.run(run()) == [[KEPT, REMOVED], [KEPT]]
+
+
+def test_forgotten_devices_are_added_again() -> None:
+    """Devices whose settings failed to load are offered again."""
+    account = HAKlyqaAccount(None, None)
+    account.forget_processed_devices([CHANGED])
+
+    def snapshot() -> KlyqaSettingsSnapshot:
+        return KlyqaSettingsSnapshot(
+            {KEPT: _device(KEPT), CHANGED: _device(CHANGED)}, {}, {}
+        )
+
+    account._processed_settings = snapshot()
+    account.forget_processed_devices([CHANGED])
+    diff = settings_diff(account._processed_settings, snapshot())
+    assert diff.added_devices == [CHANGED]
+    assert not diff.changed_devices
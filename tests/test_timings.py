@@ -0,0 +1,56 @@
+"""Tests for the klyqa timing histograms."""
+from custom_components.klyqa.timings import BUCKETS_MS, KlyqaHistogram, KlyqaTimings
+
+
+def test_bucket_placement() -> None:
+    """Durations count in the first bucket whose upper bound they don't pass."""
+    histogram = KlyqaHistogram()
+    for seconds in (0.00005, 0.001, 0.0011, 45.0):
+        histogram.add(seconds)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[BUCKETS_MS.index(1)] == 1
+    assert histogram.counts[BUCKETS_MS.index(2)] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.as_dict()["buckets"] == {
+        "<=0.1ms": 1,
+        "<=1ms": 1,
+        "<=2ms": 1,
+        f">{BUCKETS_MS[-1]}ms": 1,
+    }
+
+
+def test_percentiles() -> None:
+    """Percentiles are bucket upper bounds, capped at the maximum."""
+    histogram = KlyqaHistogram()
+    assert histogram.percentile(0.5) is None
+    for _ in range(90):
+        histogram.add(0.003)
+    for _ in range(10):
+        histogram.add(0.150)
+    assert histogram.percentile(0.5) == 5.0
+    assert histogram.percentile(0.9) == 5.0
+    assert histogram.percentile(0.99) == 150.0
+    summary = histogram.as_dict()
+    assert summary["count"] == 100
+    assert summary["mean_ms"] == 17.7
+    assert summary["max_ms"] == 150.0
+
+    histogram.add(60.0)
+    assert histogram.percentile(1.0) == 60000.0
+
+
+def test_timing_off_until_subscribed() -> None:
+    """Durations are only counted while subscribed, one time phases always."""
+    timings = KlyqaTimings()
+    assert timings.start() is None
+    timings.record("poll", 0.01)
+    timings.record("setup", 0.5, always=True)
+    assert list(timings.phases) == ["setup"]
+
+    unsubscribe = timings.subscribe()
+    timings.stop("poll", timings.start(), "00000000000000000001")
+    unsubscribe()
+    unsubscribe()
+    assert not timings.enabled
+    assert timings.phases["poll"].count == 1
+    assert timings.bulbs["00000000000000000001"]["poll"].count == 1
@@ -0,0 +1,189 @@
+"""Klyqa timing instrumentation."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable
+import time
+from typing import Any
+
+BUCKETS_MS = (
+    0.1,
+    0.2,
+    0.5,
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1000,
+    2000,
+    5000,
+    10000,
+    30000,
+)
+"""upper bounds of the histogram buckets in milliseconds"""
+
+PHASES = (
+    "build",
+    "discovery",
+    "connect",
+    "handshake",
+    "exchange",
+    "exchange_pooled",
+    "apply",
+    "command",
+    "poll",
+    "setup",
+)
+"""measured phases of the command and poll path
+
+build: building the command arguments of a light
+discovery: message queued until the bulb connection was accepted
+connect: connection accepted until it was handed to the account
+handshake: aes handshake of connections for state pushes
+exchange: handshake, encryption, send and answer on a new connection
+exchange_pooled: encryption, send and answer on a pooled connection
+apply: applying an answer to the light entity
+command: light command until the answer was applied
+poll: state request of the fleet poller until the answer
+setup: light platform setup until the first states of new lights were applied
+"""
+
+
+class KlyqaHistogram:
+    """Durations counted in fixed millisecond buckets."""
+
+    def __init__(self) -> None:
+        """Initialize the histogram."""
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Count a duration."""
+        millis = seconds * 1000
+        self.counts[bisect_left(BUCKETS_MS, millis)] += 1
+        self.count += 1
+        self.total += millis
+        if millis > self.max:
+            self.max = millis
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return the upper bound in milliseconds of the bucket of the fraction."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index == len(BUCKETS_MS):
+                    return round(self.max, 3)
+                return round(min(float(BUCKETS_MS[index]), self.max), 3)
+        return round(self.max, 3)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histogram summary and its non empty buckets."""
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        buckets = {label: count for label, count in zip(labels, self.counts) if count}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max, 3) if self.count else None,
+            "buckets": buckets,
+        }
+
+
+class KlyqaTimings:
+    """Duration histograms of the command and poll path of an account.
+
+    Durations are counted per phase and per phase of each bulb. Timing is off
+    until something subscribes to it, while off start returns None and stop
+    returns right away, so the measuring points cost nearly nothing.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the timings."""
+        self.enabled = False
+        self._subscribers = 0
+        self.phases: dict[str, KlyqaHistogram] = {}
+        self.bulbs: dict[str, dict[str, KlyqaHistogram]] = {}
+
+    def subscribe(self) -> Callable[[], None]:
+        """Turn timing on, return the callback to unsubscribe."""
+        self._subscribers += 1
+        self.enabled = True
+        unsubscribed = False
+
+        def unsubscribe() -> None:
+            nonlocal unsubscribed
+            if unsubscribed:
+                return
+            unsubscribed = True
+            self._subscribers -= 1
+            self.enabled = self._subscribers > 0
+
+        return unsubscribe
+
+    def start(self) -> float | None:
+        """Return the start time of a measurement, None while timing is off."""
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, phase: str, started: float | None, u_id: str | None = None) -> None:
+        """Count the duration since started for the phase."""
+        if started is None or not self.enabled:
+            return
+        self.record(phase, time.perf_counter() - started, u_id)
+
+    def record(
+        self,
+        phase: str,
+        seconds: float,
+        u_id: str | None = None,
+        always: bool = False,
+    ) -> None:
+        """Count a duration for the phase and the bulb.
+
+        With always the duration is counted even while timing is off, for the
+        one time phases that are over before anything subscribes.
+        """
+        if not self.enabled and not always:
+            return
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = KlyqaHistogram()
+        histogram.add(seconds)
+        if u_id:
+            bulb = self.bulbs.setdefault(u_id, {})
+            histogram = bulb.get(phase)
+            if histogram is None:
+                histogram = bulb[phase] = KlyqaHistogram()
+            histogram.add(seconds)
+
+    def reset(self) -> None:
+        """Forget all counted durations."""
+        self.phases = {}
+        self.bulbs = {}
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histograms per phase and per bulb."""
+        return {
+            "enabled": self.enabled,
+            "phases": {
+                phase: histogram.as_dict() for phase, histogram in self.phases.items()
+            },
+            "bulbs": {
+                u_id: {
+                    phase: histogram.as_dict() for phase, histogram in phases.items()
+                }
+                for u_id, phases in self.bulbs.items()
+            },
+        }